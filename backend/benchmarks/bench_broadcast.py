@@ -0,0 +1,117 @@
+# benchmarks/bench_broadcast.py
+"""
+Сравнение рассылки: последовательный send_json (как было) и fan_out.
+
+Запуск из каталога backend:
+    python benchmarks/bench_broadcast.py [--latency 0.0005] [--slow 1]
+
+Клиенты — фиктивные сокеты, каждая отправка занимает --latency секунд,
+--slow клиентов отвечают в 100 раз медленнее. Для fan_out показано время
+возврата из рассылки (сколько ждет кликнувший игрок) и время доставки
+всем быстрым клиентам.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from broadcast import ClientConnection, fan_out  # noqa: E402
+
+CLIENT_COUNTS = (2, 16, 256, 2000)
+ROUNDS = 20
+
+MESSAGE = {
+    "type": "click_result",
+    "data": {
+        "status": 200,
+        "seq": 42,
+        "click": 1,
+        "player": "player_1",
+        "slot": 1,
+        "coord": 17,
+        "color": "#FF0000",
+        "is_success": True,
+        "player_stats": {
+            "username": "player_1", "color": "#FF0000",
+            "total_clicks": 30, "success_clicks": 21, "failed_clicks": 9
+        },
+        "game_stats": {"total_clicks": 42, "clicked_cells": 35}
+    }
+}
+
+
+class FakeWebSocket:
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.received = 0
+
+    async def send_json(self, data: dict) -> None:
+        await self.send_text(json.dumps(data, separators=(",", ":"), ensure_ascii=False))
+
+    async def send_text(self, data: str) -> None:
+        await asyncio.sleep(self.latency)
+        self.received += 1
+
+    async def close(self, code: int = 1000) -> None:
+        pass
+
+
+async def serial_broadcast(clients, message):
+    """Прежняя реализация broadcast_to_game"""
+    disconnected = []
+    for ws in clients:
+        try:
+            await ws.send_json(message)
+        except Exception:
+            disconnected.append(ws)
+    return disconnected
+
+
+async def measure_serial(clients) -> float:
+    started = time.perf_counter()
+    for _ in range(ROUNDS):
+        await serial_broadcast(clients, MESSAGE)
+    return (time.perf_counter() - started) / ROUNDS * 1000
+
+
+async def measure_fan_out(clients, slow: int):
+    connections = [ClientConnection(ws).start() for ws in clients]
+    fast = clients[slow:]
+
+    started = time.perf_counter()
+    for _ in range(ROUNDS):
+        fan_out(connections, MESSAGE)
+    returned = time.perf_counter() - started
+    while any(ws.received < ROUNDS for ws in fast):
+        await asyncio.sleep(0)
+    delivered = time.perf_counter() - started
+
+    for conn in connections:
+        await conn.close(timeout=0)
+    return returned / ROUNDS * 1000, delivered / ROUNDS * 1000
+
+
+async def main(latency: float, slow: int) -> None:
+    print(f"latency={latency * 1000:.2f}ms slow_clients={slow} rounds={ROUNDS}")
+    print(f"{'clients':>8} {'serial, ms':>12} {'fan_out return, ms':>19} {'delivery, ms':>13}")
+    for count in CLIENT_COUNTS:
+        clients = [FakeWebSocket(latency) for _ in range(count)]
+        for ws in clients[:slow]:
+            ws.latency = latency * 100
+        before = await measure_serial(clients)
+        for ws in clients:
+            ws.received = 0
+        returned, delivered = await measure_fan_out(clients, slow)
+        print(f"{count:>8} {before:>12.2f} {returned:>19.3f} {delivered:>13.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--latency", type=float, default=0.0005)
+    parser.add_argument("--slow", type=int, default=1)
+    args = parser.parse_args()
+    asyncio.run(main(args.latency, args.slow))
@@ -0,0 +1,111 @@
+# benchmarks/bench_click_flood.py
+"""
+Комната под флудом кликов: лимит частоты (TokenBucket) и пачки (ClickCoalescer).
+
+Запуск из каталога backend:
+    python benchmarks/bench_click_flood.py [--seconds 3] [--flooders 3] [--rate 10] [--burst 20]
+
+Обычный игрок кликает 5 раз в секунду, --flooders скриптов шлют клики без
+пауз. Клики идут тем же путем, что в main.py: проверка лимита в цикле сокета,
+затем пачка в акторе комнаты (register_clicks и одна рассылка на пачку).
+Печатаются задержка кликов обычного игрока, примененные клики и рассылки
+в секунду — без лимита и с лимитом --rate/--burst.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import game_engine  # noqa: E402
+from broadcast import ClientConnection, fan_out  # noqa: E402
+from game_engine import CELLS_COUNT, GameEngine  # noqa: E402
+from rooms import RoomRegistry  # noqa: E402
+from throttle import ClickCoalescer, TokenBucket  # noqa: E402
+from utils import GameManager  # noqa: E402
+
+GAME_ID = 1
+COLORS = ["#FF0000", "#00FF00", "#0000FF", "#FFFF00", "#FF00FF", "#00FFFF"]
+
+
+class NullSocket:
+    async def send_text(self, payload):
+        pass
+
+    async def send_bytes(self, payload):
+        pass
+
+
+async def run(rate: float, args) -> None:
+    players = ["player"] + [f"flooder_{i}" for i in range(args.flooders)]
+    engine = game_engine._engines[GAME_ID] = GameEngine(GAME_ID, list(zip(players, COLORS)))
+    engine.board_in_db = False
+    room = {ClientConnection(NullSocket(), queue_size=10 ** 6).start() for _ in players}
+    coalescer = ClickCoalescer(RoomRegistry())
+    counters = {"applied": 0, "broadcasts": 0, "limited": 0}
+
+    async def apply(game_id, batch):
+        # Как apply_click_batch в main.py, без БД
+        results = await GameManager(None, game_id).register_clicks([(c.username, c.coord) for c in batch])
+        deltas = [result for result in results if result["status"] == 200]
+        counters["applied"] += len(deltas)
+        if deltas:
+            counters["broadcasts"] += 1
+            fan_out(room, {"type": "click_batch", "data": deltas})
+        return False
+
+    async def click(username: str, bucket: TokenBucket, coord: int) -> bool:
+        if not bucket.take():
+            counters["limited"] += 1
+            return False
+        await coalescer.submit(GAME_ID, None, username, coord, apply)
+        return True
+
+    stop = time.perf_counter() + args.seconds
+    latencies = []
+
+    async def player():
+        bucket = TokenBucket(rate, args.burst)
+        coord = 0
+        while time.perf_counter() < stop:
+            coord = coord % CELLS_COUNT + 1
+            started = time.perf_counter()
+            if await click("player", bucket, coord):
+                latencies.append(time.perf_counter() - started)
+            await asyncio.sleep(0.2)
+
+    async def flooder(name: str):
+        bucket = TokenBucket(rate, args.burst)
+        coord = 0
+        while time.perf_counter() < stop:
+            coord = coord % CELLS_COUNT + 1
+            await click(name, bucket, coord)
+            await asyncio.sleep(0)  # следующее сообщение из сокета
+
+    await asyncio.gather(player(), *(flooder(name) for name in players[1:]))
+    for conn in room:
+        await conn.close()
+    game_engine.drop_engine(GAME_ID)
+
+    label = f"rate={rate:g}/s burst={args.burst}" if rate > 0 else "no limit"
+    print(f"{label:>22}: player p50={statistics.median(latencies) * 1000:.3f}ms "
+          f"max={max(latencies) * 1000:.3f}ms, applied {counters['applied'] / args.seconds:.0f}/s, "
+          f"broadcasts {counters['broadcasts'] / args.seconds:.0f}/s, "
+          f"dropped {counters['limited'] / args.seconds:.0f}/s, avg batch {coalescer.stats()['avg_batch']}")
+
+
+async def main(args) -> None:
+    await run(0, args)
+    await run(args.rate, args)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--flooders", type=int, default=3)
+    parser.add_argument("--rate", type=float, default=10)
+    parser.add_argument("--burst", type=int, default=20)
+    asyncio.run(main(parser.parse_args()))
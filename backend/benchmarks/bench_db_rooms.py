@@ -0,0 +1,121 @@
+# benchmarks/bench_db_rooms.py
+"""
+Нагрузочный тест: параллельные комнаты в режимах DB_MODE=sync и async.
+
+Запуск из каталога backend (нужен Postgres из DATABASE_URL):
+    python benchmarks/bench_db_rooms.py [--rooms 50] [--rounds 5] [--latency 0.005]
+
+Каждая комната в цикле открывает GameManager, читает init_data и делает
+запрос длительностью --latency (имитация сетевой задержки до БД).
+Печатается общее время и максимальная задержка цикла событий: в sync-режиме
+комнаты выполняются по очереди, в async — параллельно.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text  # noqa: E402
+from sqlalchemy.engine import make_url  # noqa: E402
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine  # noqa: E402
+
+from config import DATABASE_URL  # noqa: E402
+from database import SessionLocal, init_db, run_in_session  # noqa: E402
+from game_engine import empty_board  # noqa: E402
+from models import Game, GamePlayer, User, UserState  # noqa: E402
+from utils import GameManager  # noqa: E402
+
+PREFIX = "bench_rooms_"
+
+
+def setup_rooms(count: int):
+    db = SessionLocal()
+    try:
+        game_ids = []
+        for room in range(count):
+            game = Game(is_active=True, board=empty_board(), winners=[],
+                        total_clicks=0, game_state={"state": "active", "cells": {}})
+            for slot, color in enumerate(("#FF0000", "#00FF00"), start=1):
+                user = User(username=f"{PREFIX}{room}_{slot}", password_hash="-",
+                            date_registration=datetime.utcnow(), color_used=[])
+                game.roster.append(GamePlayer(user=user, slot=slot, color=color))
+            db.add(game)
+            db.flush()
+            game_ids.append(game.id)
+        db.commit()
+        return game_ids
+    finally:
+        db.close()
+
+
+def cleanup(game_ids):
+    db = SessionLocal()
+    try:
+        db.query(UserState).filter(UserState.game_id.in_(game_ids)).delete(synchronize_session=False)
+        db.query(GamePlayer).filter(GamePlayer.game_id.in_(game_ids)).delete(synchronize_session=False)
+        db.query(Game).filter(Game.id.in_(game_ids)).delete(synchronize_session=False)
+        db.query(User).filter(User.username.like(f"{PREFIX}%")).delete(synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+async def room_workload(session_factory, game_id: int, rounds: int, latency: float):
+    for _ in range(rounds):
+        session = session_factory()
+        try:
+            manager = await GameManager.open(session, game_id)
+            await manager.init_data()
+            await run_in_session(session, lambda s: s.execute(text("SELECT pg_sleep(:t)"), {"t": latency}))
+        finally:
+            result = session.close()
+            if asyncio.iscoroutine(result):
+                await result
+
+
+async def loop_lag_probe(stop: asyncio.Event, samples: list):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(0.001)
+        samples.append(time.perf_counter() - started - 0.001)
+
+
+async def run_mode(name, session_factory, game_ids, rounds, latency):
+    stop = asyncio.Event()
+    lags = []
+    probe = asyncio.create_task(loop_lag_probe(stop, lags))
+    started = time.perf_counter()
+    await asyncio.gather(*(room_workload(session_factory, gid, rounds, latency) for gid in game_ids))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await probe
+    print(f"{name:>6} {elapsed * 1000:>12.1f} {max(lags, default=0) * 1000:>16.1f}")
+
+
+async def main(rooms: int, rounds: int, latency: float):
+    init_db()
+    game_ids = setup_rooms(rooms)
+    async_engine = create_async_engine(make_url(DATABASE_URL).set(drivername="postgresql+asyncpg"),
+                                       pool_size=rooms)
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+    try:
+        print(f"rooms={rooms} rounds={rounds} latency={latency * 1000:.1f}ms")
+        print(f"{'mode':>6} {'total, ms':>12} {'max loop lag, ms':>16}")
+        await run_mode("sync", SessionLocal, game_ids, rounds, latency)
+        await run_mode("async", AsyncSessionLocal, game_ids, rounds, latency)
+    finally:
+        await async_engine.dispose()
+        cleanup(game_ids)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rooms", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.005)
+    args = parser.parse_args()
+    asyncio.run(main(args.rooms, args.rounds, args.latency))
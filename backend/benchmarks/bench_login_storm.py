@@ -0,0 +1,101 @@
+# benchmarks/bench_login_storm.py
+"""
+Задержка кликов во время волны входов.
+
+Запуск из каталога backend:
+    python benchmarks/bench_login_storm.py [--logins 32] [--rounds 12] [--interval 0.01]
+
+Игровой цикл каждые --interval секунд применяет клик к движку в памяти и
+меряет, насколько позже запланированного он выполнился. Параллельно
+--logins пользователей проверяют пароль:
+    inline — pwd_context.verify прямо в корутине (как было)
+    pool   — PasswordHasher: ограниченный пул потоков, сверх лимита 503
+Печатаются p50/p99/max задержки клика для каждого варианта и без входов.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from passlib.context import CryptContext  # noqa: E402
+
+from game_engine import CELLS_COUNT, GameEngine  # noqa: E402
+from passwords import PasswordHasher, PasswordPoolBusy  # noqa: E402
+
+PASSWORD = "correct horse battery staple"
+
+
+async def click_loop(engine: GameEngine, interval: float, stop: asyncio.Event):
+    latencies = []
+    coord = 0
+    while not stop.is_set():
+        planned = time.perf_counter() + interval
+        await asyncio.sleep(interval)
+        coord = coord % CELLS_COUNT + 1
+        engine.click("player_1", coord)
+        latencies.append(time.perf_counter() - planned)
+    return latencies
+
+
+async def login_inline(context: CryptContext, password_hash: str) -> str:
+    context.verify(PASSWORD, password_hash)
+    return "ok"
+
+
+async def login_pool(hasher: PasswordHasher, password_hash: str) -> str:
+    try:
+        await hasher.verify(PASSWORD, password_hash)
+        return "ok"
+    except PasswordPoolBusy:
+        return "503"
+
+
+async def run(mode: str, args, context: CryptContext, password_hash: str):
+    engine = GameEngine(1, [("player_1", "#FF0000"), ("player_2", "#00FF00")])
+    hasher = PasswordHasher(context, args.workers, args.queue_limit)
+    stop = asyncio.Event()
+    clicks = asyncio.create_task(click_loop(engine, args.interval, stop))
+
+    started = time.perf_counter()
+    if mode == "inline":
+        results = await asyncio.gather(*(login_inline(context, password_hash) for _ in range(args.logins)))
+    elif mode == "pool":
+        results = await asyncio.gather(*(login_pool(hasher, password_hash) for _ in range(args.logins)))
+    else:
+        await asyncio.sleep(1.0)
+        results = []
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    latencies = await clicks
+    hasher.shutdown()
+
+    ms = sorted(latency * 1000 for latency in latencies)
+    p99 = ms[min(len(ms) - 1, int(len(ms) * 0.99))]
+    print(f"{mode:>6}: logins={len(results):3d} rejected={results.count('503'):3d} "
+          f"time={elapsed:6.2f}s  click lag p50={statistics.median(ms):7.1f}ms "
+          f"p99={p99:7.1f}ms max={ms[-1]:7.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=32)
+    parser.add_argument("--rounds", type=int, default=12)
+    parser.add_argument("--interval", type=float, default=0.01)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--queue-limit", type=int, default=16)
+    args = parser.parse_args()
+
+    context = CryptContext(schemes=["bcrypt"], bcrypt__rounds=args.rounds)
+    password_hash = context.hash(PASSWORD)
+
+    for mode in ("idle", "inline", "pool"):
+        asyncio.run(run(mode, args, context, password_hash))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+# benchmarks/bench_matchmaking.py
+"""
+Пропускная способность входа в лобби при большой истории игр.
+
+Запуск из каталога backend (нужен Postgres из DATABASE_URL):
+    python benchmarks/bench_matchmaking.py [--history 10000] [--joins 2000] [--room-size 2]
+    python benchmarks/bench_matchmaking.py --no-db   # только очередь подбора
+
+Сначала в БД создается --history завершенных игр (is_active=False), затем
+сравниваются:
+    scan  — старый подбор: SELECT первой неактивной игры на каждый вход
+    queue — очередь подбора в памяти (MatchmakingQueue.current + join)
+Печатается число входов в секунду для каждого варианта.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from matchmaking import MatchmakingQueue  # noqa: E402
+
+PREFIX = "bench_mm_"
+COLORS = ["#FF0000", "#00FF00", "#0000FF", "#FFFF00", "#FF00FF", "#00FFFF", "#800000", "#008000"]
+
+
+def seed_history(count: int):
+    from database import SessionLocal, init_db
+    from game_engine import empty_board
+    from models import Game
+
+    init_db()
+    db = SessionLocal()
+    try:
+        db.bulk_insert_mappings(Game, [
+            {"is_active": False, "board": empty_board(), "claimed_cells": 0, "total_clicks": 0,
+             "winners": [f"{PREFIX}{n}"], "game_state": {"state": "finished"}}
+            for n in range(count)
+        ])
+        db.commit()
+    finally:
+        db.close()
+
+
+def cleanup():
+    from database import SessionLocal
+    from models import Game
+
+    db = SessionLocal()
+    try:
+        db.execute(Game.__table__.delete().where(Game.winners[1].like(f"{PREFIX}%")))
+        db.commit()
+    finally:
+        db.close()
+
+
+def bench_scan(joins: int) -> float:
+    """Старый путь: поиск ожидающей игры запросом на каждый вход"""
+    from database import SessionLocal
+    from models import Game
+
+    db = SessionLocal()
+    try:
+        started = time.perf_counter()
+        for _ in range(joins):
+            db.query(Game).filter(Game.is_active == False).first()  # noqa: E712
+            db.rollback()
+        return time.perf_counter() - started
+    finally:
+        db.close()
+
+
+def bench_queue(joins: int, room_size: int) -> float:
+    queue = MatchmakingQueue(room_size)
+    started = time.perf_counter()
+    for n in range(joins):
+        lobby = queue.current()
+        queue.join(lobby, f"{PREFIX}{n}", COLORS[lobby.fill])
+        if lobby.is_full:
+            queue.take(lobby.lobby_id)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--history", type=int, default=10000)
+    parser.add_argument("--joins", type=int, default=2000)
+    parser.add_argument("--room-size", type=int, default=2)
+    parser.add_argument("--no-db", action="store_true")
+    args = parser.parse_args()
+
+    elapsed = bench_queue(args.joins, args.room_size)
+    print(f"queue: {args.joins / elapsed:12.0f} joins/s")
+
+    if args.no_db:
+        return
+
+    seed_history(args.history)
+    try:
+        elapsed = bench_scan(args.joins)
+        print(f"scan:  {args.joins / elapsed:12.0f} joins/s  (history={args.history})")
+    finally:
+        cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+# benchmarks/bench_tick.py
+"""
+Занятая комната: рассылка на каждый клик против тактов ROOM_TICK_HZ.
+
+Запуск из каталога backend:
+    python benchmarks/bench_tick.py [--seconds 3] [--players 6] [--cps 8] [--hz 0 20 60]
+
+--players игроков кликают по --cps раз в секунду каждый (в пределах лимита
+CLICK_RATE), клики идут тем же путем, что в main.py: ClickCoalescer, актор
+комнаты, register_clicks и одна рассылка на пачку. Для каждого значения --hz
+(0 — без тактов) печатаются задержка клика, рассылки, кодирования и отправки
+в сокеты в секунду.
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import game_engine  # noqa: E402
+from broadcast import ClientConnection, fan_out  # noqa: E402
+from game_engine import CELLS_COUNT, GameEngine  # noqa: E402
+from rooms import RoomRegistry  # noqa: E402
+from throttle import ClickCoalescer  # noqa: E402
+from utils import GameManager  # noqa: E402
+
+GAME_ID = 1
+COLORS = ["#FF0000", "#00FF00", "#0000FF", "#FFFF00", "#FF00FF", "#00FFFF"]
+
+
+class CountingSocket:
+    sends = 0
+
+    async def send_text(self, payload):
+        CountingSocket.sends += 1
+
+    async def send_bytes(self, payload):
+        CountingSocket.sends += 1
+
+
+async def run(hz: float, args) -> None:
+    players = [f"player_{i}" for i in range(args.players)]
+    engine = game_engine._engines[GAME_ID] = GameEngine(
+        GAME_ID, list(zip(players, COLORS * (args.players // len(COLORS) + 1)))
+    )
+    engine.board_in_db = False
+    room = {ClientConnection(CountingSocket(), queue_size=10 ** 6, binary=True).start() for _ in players}
+    coalescer = ClickCoalescer(RoomRegistry(), tick_hz=hz)
+    counters = {"broadcasts": 0, "encodes": 0}
+    CountingSocket.sends = 0
+
+    async def apply(game_id, batch):
+        # Как apply_click_batch в main.py, без БД
+        results = await GameManager(None, game_id).register_clicks([(c.username, c.coord) for c in batch])
+        deltas = [result for result in results if result["status"] == 200]
+        if deltas:
+            message = ({"type": "click_result", "data": deltas[0]} if len(deltas) == 1
+                       else {"type": "click_batch", "data": deltas})
+            counters["broadcasts"] += 1
+            counters["encodes"] += 1  # все соединения бинарные — одно кодирование на рассылку
+            fan_out(room, message)
+        return False
+
+    stop = time.perf_counter() + args.seconds
+    latencies = []
+
+    async def player(name: str):
+        rng = random.Random(name)
+        await asyncio.sleep(rng.random() / args.cps)
+        while time.perf_counter() < stop:
+            started = time.perf_counter()
+            await coalescer.submit(GAME_ID, None, name, rng.randint(1, CELLS_COUNT), apply)
+            latencies.append(time.perf_counter() - started)
+            await asyncio.sleep(max(0.0, 1 / args.cps - (time.perf_counter() - started)))
+
+    await asyncio.gather(*(player(name) for name in players))
+    for conn in room:
+        await conn.close()
+    game_engine.drop_engine(GAME_ID)
+
+    latencies.sort()
+    label = f"tick {hz:g} Hz" if hz > 0 else "per click"
+    print(f"{label:>12}: p50={statistics.median(latencies) * 1000:.2f}ms "
+          f"p99={latencies[int(len(latencies) * 0.99)] * 1000:.2f}ms, "
+          f"clicks {len(latencies) / args.seconds:.0f}/s, "
+          f"broadcasts {counters['broadcasts'] / args.seconds:.0f}/s, "
+          f"encodes {counters['encodes'] / args.seconds:.0f}/s, "
+          f"socket sends {CountingSocket.sends / args.seconds:.0f}/s, "
+          f"avg batch {coalescer.stats()['avg_batch']}")
+
+
+async def main(args) -> None:
+    for hz in args.hz:
+        await run(hz, args)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--players", type=int, default=6)
+    parser.add_argument("--cps", type=float, default=8)
+    parser.add_argument("--hz", type=float, nargs="+", default=[0, 20, 60])
+    asyncio.run(main(parser.parse_args()))
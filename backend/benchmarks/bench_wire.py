@@ -0,0 +1,84 @@
+# benchmarks/bench_wire.py
+"""
+Размер и цена кодирования дельты клика: JSON против бинарного кадра (wire.py).
+
+Запуск из каталога backend:
+    python benchmarks/bench_wire.py [--rounds 100000] [--clients 16]
+
+Печатает байт на дельту и микросекунды на кодирование для каждого формата,
+а также время fan_out одной дельты на --clients JSON- и бинарных соединений.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from broadcast import ClientConnection, encode, fan_out  # noqa: E402
+from wire import decode_click, encode_binary  # noqa: E402
+
+MESSAGE = {
+    "type": "click_result",
+    "data": {
+        "status": 200,
+        "seq": 1042,
+        "click": 1,
+        "player": "player_1",
+        "slot": 1,
+        "coord": 17,
+        "color": "#FF0000",
+        "is_success": True,
+        "player_stats": {
+            "username": "player_1", "color": "#FF0000",
+            "total_clicks": 530, "success_clicks": 21, "failed_clicks": 509
+        },
+        "game_stats": {"total_clicks": 1042, "clicked_cells": 57}
+    }
+}
+
+
+class NullSocket:
+    async def send_text(self, payload):
+        pass
+
+    async def send_bytes(self, payload):
+        pass
+
+
+def per_call(fn, rounds: int) -> float:
+    started = time.perf_counter()
+    for _ in range(rounds):
+        fn(MESSAGE)
+    return (time.perf_counter() - started) / rounds * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rounds", type=int, default=100000)
+    parser.add_argument("--clients", type=int, default=16)
+    args = parser.parse_args()
+
+    text, frame = encode(MESSAGE), encode_binary(MESSAGE)
+    decoded = decode_click(frame)
+    assert decoded["seq"] == MESSAGE["data"]["seq"] and decoded["coord"] == MESSAGE["data"]["coord"]
+
+    json_us, binary_us = per_call(encode, args.rounds), per_call(encode_binary, args.rounds)
+    print(f"json:   {len(text.encode()):4d} bytes, {json_us:.2f} us/encode")
+    print(f"binary: {len(frame):4d} bytes, {binary_us:.2f} us/encode "
+          f"({len(text.encode()) / len(frame):.1f}x smaller, {json_us / binary_us:.1f}x faster)")
+
+    for binary in (False, True):
+        # Соединения без писателя: меряем только сериализацию и постановку в очереди
+        clients = [ClientConnection(NullSocket(), queue_size=args.rounds + 1, binary=binary)
+                   for _ in range(args.clients)]
+        rounds = args.rounds // 10
+        started = time.perf_counter()
+        for _ in range(rounds):
+            fan_out(clients, MESSAGE)
+        elapsed = (time.perf_counter() - started) / rounds * 1e6
+        print(f"fan_out to {args.clients} {'binary' if binary else 'json'} clients: {elapsed:.2f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,576 @@
+# benchmarks/load_test.py
+"""
+Нагрузочный тест лобби и игровых сокетов с базовой линией результатов.
+
+Запуск из каталога backend:
+    python benchmarks/load_test.py [--lobbies 20] [--clicks 50] [--seed 1]
+    python benchmarks/load_test.py --db                  # то же с Postgres из DATABASE_URL
+    python benchmarks/load_test.py --target ws --url ws://127.0.0.1:8000   # против запущенного сервера
+    python benchmarks/load_test.py --save-baseline       # записать результат в benchmarks/baseline.json
+    python benchmarks/load_test.py --check [--tolerance 0.3]   # сравнить с базовой линией, код 1 при регрессии
+    python benchmarks/load_test.py --db --check          # бюджеты запросов на Postgres, код 1 при превышении
+
+Каждый замер — медиана --repeat прогонов (по умолчанию 3), и для базовой
+линии, и для проверки.
+
+--lobbies лобби по ROOM_SIZE ботов: боты по одному входят в лобби (join по /ws),
+после game_start открывают сокет игры и делают по --clicks кликов, дожидаясь
+рассылки своего клика перед следующим. Печатаются p50/p95/p99 задержки
+клик -> рассылка, клики/с, SQL-запросов на клик (с --db), память на комнату и p95
+времени add_player, register_click и fan_out. С --db каждый вход в лобби
+(add_player), старт игры, пачка кликов и подведение итогов проверяются
+бюджетом запросов HOT_PATH_BUDGETS (query_budget): лишний запрос на горячем
+пути завершает тест с кодом 1. --db --check — проверка для CI: бюджеты
+и, если для inproc-db записана базовая линия, ее показатели.
+
+inproc — те же обработчики (LobbyManager, GameManager, акторы комнат, fan_out
+с очередями ClientConnection) в одном процессе, сокеты заменены ботами;
+без --db пользователи и движки живут только в памяти (CLAIM_MODE=memory,
+игра не завершается). ws — настоящие WebSocket к серверу: боты регистрируются
+через /register, SQL на клик берется из /metrics (при METRICS_ENABLED=1),
+память на комнату не измеряется; сервер запускайте с CLICK_RATE=0, иначе
+боты упрутся в лимит частоты кликов.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+import urllib.error
+import urllib.parse
+import urllib.request
+from contextlib import nullcontext
+from datetime import datetime
+from typing import Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import game_engine  # noqa: E402
+from broadcast import ClientConnection, fan_out  # noqa: E402
+from config import CLAIM_MODE, ROOM_SIZE  # noqa: E402
+from game_engine import CELLS_COUNT, GameEngine  # noqa: E402
+from query_profile import QueryBudgetExceeded, query_budget  # noqa: E402
+from rooms import RoomActor, RoomRegistry  # noqa: E402
+from throttle import ClickCoalescer  # noqa: E402
+from utils import GameManager, LobbyManager  # noqa: E402
+
+PREFIX = "load_bot_"
+PASSWORD = "load_test"
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+# Чем больше, тем хуже (кроме clicks_per_sec); допуск на шум — относительный
+# --tolerance и абсолютный из ABS_SLACK
+HIGHER_IS_WORSE = ("click_p50_ms", "click_p95_ms", "click_p99_ms", "queries_per_click",
+                   "memory_per_room_kb", "add_player_p95_ms", "register_click_p95_ms", "fan_out_p95_ms")
+LOWER_IS_WORSE = ("clicks_per_sec",)
+ABS_SLACK = {"queries_per_click": 0.05, "memory_per_room_kb": 1.0}
+MS_SLACK = 0.05
+
+# Запросов на вызов в режиме --db: вход — проверка пользователя, клик по живому
+# движку — без БД (при CLAIM_MODE=db — условный UPDATE клетки). Старт — INSERT
+# игры, SELECT игроков, UPDATE цвета, INSERT состава и состояний (+1 запас).
+# Итоги — загрузка игры, сброс движка (UPDATE игры, user_states, users), refresh,
+# закрытие игры, итоги игроков, недостающие состояния, UPDATE users, рейтинг
+# (upsert и цвета), UPDATE игры и ее чтение после commit. Ни один бюджет не зависит
+# от числа игроков: N+1 по игрокам превышает его уже при ROOM_SIZE=2
+HOT_PATH_BUDGETS = {
+    "add_player": 1,
+    "start_game": 6,
+    "register_click": 1 if CLAIM_MODE == "db" else 0,
+    "finish_game": 14,
+}
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+
+def ms(value: Optional[float]) -> Optional[float]:
+    return None if value is None else round(value * 1000, 3)
+
+
+class Bot:
+    """Игрок: запоминает свою игру и ждет рассылку своего клика"""
+
+    def __init__(self, name: str, color: str):
+        self.name = name
+        self.color = color
+        self.game_id: Optional[int] = None
+        self.latencies: List[float] = []
+        self.joining: Optional[asyncio.Future] = None
+        self.started: Optional[asyncio.Future] = None
+        self.waiting = None  # (coord, future)
+
+    def receive(self, payload: str) -> None:
+        message = json.loads(payload)
+        kind = message.get("type")
+        if kind == "lobby_update" or (kind is None and "error" in message):
+            names = [name for name, _ in message.get("players", [])]
+            if self.joining is not None and not self.joining.done() and (self.name in names or kind is None):
+                self.joining.set_result(kind is not None)
+        elif kind == "game_start":
+            if self.name in [name for name, _ in message["players"]]:
+                self.game_id = message["game_id"]
+                if self.started is not None and not self.started.done():
+                    self.started.set_result(True)
+        elif kind in ("click_result", "click_batch", "error") and self.waiting is not None:
+            coord, future = self.waiting
+            deltas = message["data"] if kind == "click_batch" else [message.get("data") or {}]
+            if kind == "error" or any(d.get("player") == self.name and d.get("coord") == coord for d in deltas):
+                self.waiting = None
+                if not future.done():
+                    future.set_result(kind != "error")
+
+    def expect_click(self, coord: int) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        self.waiting = (coord, future)
+        return future
+
+
+class BotSocket:
+    """Вместо WebSocket в ClientConnection: отправленное сразу получает бот"""
+
+    def __init__(self, bot: Optional[Bot]):
+        self.bot = bot
+
+    async def send_text(self, payload: str) -> None:
+        if self.bot is not None:
+            self.bot.receive(payload)
+
+    async def close(self, code: int = 1000) -> None:
+        pass
+
+
+_game_ids = itertools.count(1)
+
+
+class MemoryLobbyManager(LobbyManager):
+    """Лобби без БД: пользователи считаются зарегистрированными, игра — только движок"""
+
+    def _user_exists(self, username: str) -> bool:
+        return True
+
+    def _start_game(self, lobby):
+        game_id = next(_game_ids)
+        engine = GameEngine(game_id, list(lobby.roster))
+        engine.board_in_db = False
+        game_engine._engines[game_id] = engine
+        return game_id, datetime.utcnow()
+
+
+class QueryCounter:
+    """Число SQL-запросов движков database (для режима --db)"""
+
+    def __init__(self):
+        from sqlalchemy import event
+        import database
+
+        self.count = 0
+        engines = [database.engine] + ([database.async_engine.sync_engine] if database.ASYNC_MODE else [])
+        for engine in engines:
+            event.listen(engine, "after_cursor_execute", self._on_query)
+
+    def _on_query(self, *args) -> None:
+        self.count += 1
+
+
+def make_bots(lobbies: int) -> List[Bot]:
+    palette = LobbyManager.COLOR_PALETTE
+    return [Bot(f"{PREFIX}{i}", palette[i % ROOM_SIZE]) for i in range(lobbies * ROOM_SIZE)]
+
+
+# --- inproc ---
+
+def scope(use_db: bool):
+    if use_db:
+        from database import session_scope
+        return session_scope()
+    return nullcontext()
+
+
+def budget(use_db: bool, action: str, calls: int = 1):
+    return query_budget(HOT_PATH_BUDGETS[action] * calls, label=action) if use_db else nullcontext()
+
+
+async def inproc_lobby(bots: List[Bot], use_db: bool, timings: Dict[str, List[float]]) -> None:
+    manager_cls = LobbyManager if use_db else MemoryLobbyManager
+    conns = [ClientConnection(BotSocket(bot)).start() for bot in bots]
+    for bot in bots:
+        async with scope(use_db) as db:
+            lobby = manager_cls(db)
+            lobby_id = lobby.current_lobby().lobby_id
+            started = time.perf_counter()
+            with budget(use_db, "add_player"):
+                result = await lobby.add_player(lobby_id, bot.name, bot.color)
+            timings["add_player"].append(time.perf_counter() - started)
+            start_check = None
+            if result["status"] == 200:
+                with budget(use_db, "start_game"):
+                    start_check = await lobby.start_game_check(lobby_id)
+        if result["status"] != 200:
+            raise RuntimeError(f"{bot.name}: {result}")
+        fan_out(conns, {"type": "lobby_update", "game_id": lobby_id, **result})
+        if start_check["status"] == 200:
+            fan_out(conns, {"type": "game_start", **start_check})
+        # Следующий вход — после доставки рассылки, иначе очереди лобби переполнятся
+        while any(conn.depth for conn in conns):
+            await asyncio.sleep(0)
+    for conn in conns:
+        await conn.close()
+    missing = [bot.name for bot in bots if bot.game_id is None]
+    if missing:
+        raise RuntimeError(f"Не получили game_start: {missing[:5]}")
+
+
+async def inproc_game(bots: List[Bot], clicks: int, rng: random.Random, use_db: bool,
+                      timings: Dict[str, List[float]]) -> float:
+    rooms: Dict[int, set] = {}
+    conns = {}
+    # Свои акторы на каждый прогон: акторы прошлого прогона остались в закрытом цикле событий
+    click_batches = ClickCoalescer(RoomRegistry())
+    for bot in bots:
+        conns[bot.name] = ClientConnection(BotSocket(bot)).start()
+        rooms.setdefault(bot.game_id, set()).add(conns[bot.name])
+    if use_db:
+        # Как при подключении к /game/{id}/ws: снимок поднимает движок из БД до кликов
+        for game_id in rooms:
+            async with scope(use_db) as db:
+                await (await GameManager.open(db, game_id)).snapshot()
+
+    async def apply(game_id: int, batch) -> bool:
+        # Как process_click_batch/apply_click_batch в main.py
+        async with scope(use_db) as db:
+            manager = GameManager(db, game_id)
+            started = time.perf_counter()
+            with budget(use_db, "register_click", len(batch)):
+                results = await manager.register_clicks([(click.username, click.coord) for click in batch])
+            timings["register_click"].append((time.perf_counter() - started) / len(batch))
+            timings["batch"].append(len(batch))
+
+            deltas = []
+            for click, result in zip(batch, results):
+                if result["status"] != 200:
+                    click.connection.send({"type": "error", "message": result.get("error")})
+                else:
+                    deltas.append(result)
+            if not deltas:
+                return False
+            started = time.perf_counter()
+            if len(deltas) == 1:
+                fan_out(rooms[game_id], {"type": "click_result", "data": deltas[0]})
+            else:
+                fan_out(rooms[game_id], {"type": "click_batch", "data": deltas})
+            timings["fan_out"].append(time.perf_counter() - started)
+            if use_db and deltas[-1]["game_stats"]["clicked_cells"] >= CELLS_COUNT:
+                with budget(use_db, "finish_game"):
+                    finish = await manager.check_finish_game()
+                if finish is not None and finish["status"] == 200:
+                    fan_out(rooms[game_id], {"type": "finish_game", "data": finish})
+                    return True
+        return False
+
+    async def play(bot: Bot) -> None:
+        for _ in range(clicks):
+            coord = rng.randint(1, CELLS_COUNT)
+            future = bot.expect_click(coord)
+            sent = time.perf_counter()
+            await click_batches.submit(bot.game_id, conns[bot.name], bot.name, coord, apply)
+            if not await future:
+                return  # игра завершена
+            bot.latencies.append(time.perf_counter() - sent)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(play(bot) for bot in bots))
+    elapsed = time.perf_counter() - started
+    for conn in conns.values():
+        await conn.close()
+    for game_id in rooms:
+        game_engine.drop_engine(game_id)
+    return elapsed
+
+
+async def memory_per_room(rooms: int = 50) -> float:
+    """Память одной комнаты: движок с заполненным полем, актор и ROOM_SIZE соединений (КБ)"""
+    registry = RoomRegistry()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    held = []
+    for n in range(rooms):
+        players = [(f"mem_{n}_{slot}", LobbyManager.COLOR_PALETTE[slot]) for slot in range(ROOM_SIZE)]
+        engine = GameEngine(-n - 1, players)
+        for coord in range(1, CELLS_COUNT + 1):
+            engine.click(players[coord % ROOM_SIZE][0], coord)
+        conns = [ClientConnection(BotSocket(None)).start() for _ in players]
+        held.append((engine, conns, RoomActor(-n - 1, registry)))
+    await asyncio.sleep(0)
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    for _, conns, actor in held:
+        actor.task.cancel()
+        for conn in conns:
+            await conn.close()
+    return used / rooms / 1024
+
+
+def create_users(bots: List[Bot]) -> List[int]:
+    from database import SessionLocal, init_db
+    from models import User
+
+    init_db()
+    db = SessionLocal()
+    try:
+        users = [User(username=bot.name, password_hash="-", date_registration=datetime.utcnow(),
+                      total_games=0, wins_count=0, total_clicks=0, success_clicks=0, color_used=[])
+                 for bot in bots]
+        db.add_all(users)
+        db.commit()
+        return [user.id for user in users]
+    finally:
+        db.close()
+
+
+def cleanup(user_ids: List[int]) -> None:
+    from database import SessionLocal
+    from models import Game, GamePlayer, PlayerStats, User, UserState
+
+    db = SessionLocal()
+    try:
+        game_ids = [row.game_id for row in
+                    db.query(GamePlayer.game_id).filter(GamePlayer.user_id.in_(user_ids)).distinct()]
+        db.query(PlayerStats).filter(PlayerStats.user_id.in_(user_ids)).delete(synchronize_session=False)
+        db.query(UserState).filter(UserState.user_id.in_(user_ids)).delete(synchronize_session=False)
+        db.query(GamePlayer).filter(GamePlayer.game_id.in_(game_ids)).delete(synchronize_session=False)
+        db.query(Game).filter(Game.id.in_(game_ids)).delete(synchronize_session=False)
+        db.query(User).filter(User.id.in_(user_ids)).delete(synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+async def run_inproc(args) -> Dict:
+    rng = random.Random(args.seed)
+    bots = make_bots(args.lobbies)
+    timings = {"add_player": [], "register_click": [], "fan_out": [], "batch": []}
+    user_ids = create_users(bots) if args.db else []
+    counter = QueryCounter() if args.db else None
+    try:
+        await inproc_lobby(bots, args.db, timings)
+        queries_before = counter.count if counter else 0
+        elapsed = await inproc_game(bots, args.clicks, rng, args.db, timings)
+        if counter:
+            await game_engine.flush_all()  # отложенная запись счетчиков — тоже цена кликов
+        queries = (counter.count - queries_before) if counter else 0
+    finally:
+        if args.db:
+            cleanup(user_ids)
+
+    latencies = [latency for bot in bots for latency in bot.latencies]
+    return {
+        **summarize(latencies, elapsed),
+        # Без --db запросов нет по построению: 0 в базовой линии ничего бы не проверял
+        "queries_per_click": round(queries / max(1, len(latencies)), 3) if args.db else None,
+        "memory_per_room_kb": round(await memory_per_room(), 1),
+        "add_player_p95_ms": ms(percentile(timings["add_player"], 95)),
+        "register_click_p95_ms": ms(percentile(timings["register_click"], 95)),
+        "fan_out_p95_ms": ms(percentile(timings["fan_out"], 95)),
+        "avg_batch": round(sum(timings["batch"]) / max(1, len(timings["batch"])), 2)
+    }
+
+
+# --- ws ---
+
+def http_base(url: str) -> str:
+    return "http" + url[len("ws"):]
+
+
+def register(base: str, username: str) -> None:
+    data = urllib.parse.urlencode({"username": username, "password": PASSWORD}).encode()
+    try:
+        urllib.request.urlopen(f"{base}/register", data=data, timeout=30).close()
+    except urllib.error.HTTPError as e:
+        if e.code != 400:  # 400 — пользователь уже есть с прошлого запуска
+            raise
+
+
+def scrape_queries(base: str) -> Optional[float]:
+    """db_query_seconds_count из /metrics сервера (None, если метрики выключены)"""
+    try:
+        with urllib.request.urlopen(f"{base}/metrics", timeout=10) as response:
+            text = response.read().decode()
+    except urllib.error.HTTPError:
+        return None
+    for line in text.splitlines():
+        if line.startswith("db_query_seconds_count"):
+            return float(line.split()[-1])
+    return 0.0
+
+
+async def run_ws(args) -> Dict:
+    import websockets
+
+    rng = random.Random(args.seed)
+    bots = make_bots(args.lobbies)
+    base = http_base(args.url)
+    await asyncio.gather(*(asyncio.to_thread(register, base, bot.name) for bot in bots))
+    join_times = []
+
+    async def reader(ws, bot: Bot) -> None:
+        async for payload in ws:
+            bot.receive(payload)
+
+    # Лобби: все боты на связи, входят по одному
+    sockets = [await websockets.connect(f"{args.url}/ws", max_size=None) for _ in bots]
+    readers = [asyncio.create_task(reader(ws, bot)) for ws, bot in zip(sockets, bots)]
+    loop = asyncio.get_running_loop()
+    for ws, bot in zip(sockets, bots):
+        bot.started = loop.create_future()
+        bot.joining = loop.create_future()
+        started = time.perf_counter()
+        await ws.send(json.dumps({"action": "join", "username": bot.name, "color": bot.color}))
+        if not await asyncio.wait_for(bot.joining, 30):
+            raise RuntimeError(f"{bot.name}: вход в лобби отклонен")
+        join_times.append(time.perf_counter() - started)
+    await asyncio.wait_for(asyncio.gather(*(bot.started for bot in bots)), 30)
+    for ws, task in zip(sockets, readers):
+        await ws.close()
+        task.cancel()
+
+    queries_before = scrape_queries(base)
+
+    async def play(bot: Bot) -> None:
+        async with websockets.connect(f"{args.url}/game/{bot.game_id}/ws", max_size=None) as ws:
+            first = json.loads(await ws.recv())  # снимок
+            if first.get("type") == "redirect":
+                raise RuntimeError(f"Игрой {bot.game_id} владеет {first['url']}: запустите тест с одним воркером")
+            task = asyncio.create_task(reader(ws, bot))
+            try:
+                for _ in range(args.clicks):
+                    coord = rng.randint(1, CELLS_COUNT)
+                    future = bot.expect_click(coord)
+                    sent = time.perf_counter()
+                    await ws.send(json.dumps({"action": "click", "username": bot.name, "coord": coord}))
+                    if not await asyncio.wait_for(future, 30):
+                        return
+                    bot.latencies.append(time.perf_counter() - sent)
+            finally:
+                task.cancel()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(play(bot) for bot in bots))
+    elapsed = time.perf_counter() - started
+
+    latencies = [latency for bot in bots for latency in bot.latencies]
+    queries_after = scrape_queries(base)
+    queries = None
+    if queries_before is not None and queries_after is not None:
+        queries = round((queries_after - queries_before) / max(1, len(latencies)), 3)
+    return {
+        **summarize(latencies, elapsed),
+        "queries_per_click": queries,
+        "memory_per_room_kb": None,
+        "add_player_p95_ms": ms(percentile(join_times, 95)),
+        "register_click_p95_ms": None,
+        "fan_out_p95_ms": None
+    }
+
+
+# --- отчет и базовая линия ---
+
+def summarize(latencies: List[float], elapsed: float) -> Dict:
+    return {
+        "clicks": len(latencies),
+        "click_p50_ms": ms(percentile(latencies, 50)),
+        "click_p95_ms": ms(percentile(latencies, 95)),
+        "click_p99_ms": ms(percentile(latencies, 99)),
+        "clicks_per_sec": round(len(latencies) / elapsed, 1) if elapsed else None
+    }
+
+
+def median_result(runs: List[Dict]) -> Dict:
+    """Медиана каждого показателя по прогонам (None — если показатель не измерялся)"""
+    result = {}
+    for key in runs[0]:
+        values = [run[key] for run in runs if run[key] is not None]
+        result[key] = round(statistics.median(values), 3) if values else None
+    return result
+
+
+def regressions(result: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    found = []
+    for key in HIGHER_IS_WORSE + LOWER_IS_WORSE:
+        current, expected = result.get(key), baseline.get(key)
+        if current is None or expected is None:
+            continue
+        slack = ABS_SLACK.get(key, MS_SLACK if key.endswith("_ms") else 0)
+        if key in HIGHER_IS_WORSE and current > expected * (1 + tolerance) + slack:
+            found.append(f"{key}: {current} > {expected} (+{tolerance:.0%})")
+        if key in LOWER_IS_WORSE and current < expected * (1 - tolerance):
+            found.append(f"{key}: {current} < {expected} (-{tolerance:.0%})")
+    return found
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--target", choices=("inproc", "ws"), default="inproc")
+    parser.add_argument("--db", action="store_true", help="inproc с Postgres из DATABASE_URL")
+    parser.add_argument("--url", default="ws://127.0.0.1:8000")
+    parser.add_argument("--lobbies", type=int, default=20)
+    parser.add_argument("--clicks", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--check", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.3)
+    args = parser.parse_args()
+
+    scenario = args.target + ("-db" if args.db else "")
+    try:
+        runs = [asyncio.run(run_ws(args) if args.target == "ws" else run_inproc(args)) for _ in range(args.repeat)]
+    except QueryBudgetExceeded as e:
+        print(f"QUERY BUDGET {e}")
+        return 1
+    result = median_result(runs)
+    result = {"lobbies": args.lobbies, "bots": args.lobbies * ROOM_SIZE, **result}
+    print(f"{scenario}: " + ", ".join(f"{key}={value}" for key, value in result.items()))
+
+    baselines = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baselines = json.load(f)
+
+    if args.save_baseline:
+        baselines[scenario] = result
+        with open(args.baseline, "w") as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"baseline {scenario} saved to {args.baseline}")
+
+    if args.check:
+        if scenario not in baselines:
+            print(f"no baseline for {scenario} in {args.baseline}")
+            # С --db бюджеты запросов уже проверены прогоном — базовая линия времени не обязательна
+            return 0 if args.db else 1
+        expected = baselines[scenario]
+        if (expected.get("lobbies"), expected.get("clicks")) != (result["lobbies"], result["clicks"]):
+            print(f"warning: baseline recorded with lobbies={expected.get('lobbies')}, "
+                  f"clicks={expected.get('clicks')}")
+        found = regressions(result, expected, args.tolerance)
+        for line in found:
+            print(f"REGRESSION {line}")
+        if not found:
+            print(f"{scenario}: within {args.tolerance:.0%} of baseline")
+        return 1 if found else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
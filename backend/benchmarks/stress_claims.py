@@ -0,0 +1,133 @@
+# benchmarks/stress_claims.py
+"""
+Стресс-проверка занятия клеток: в каждой завершенной игре ровно 100 успешных кликов.
+
+Запуск из каталога backend:
+    python benchmarks/stress_claims.py --mode memory [--games 20] [--clicks 5000]
+    python benchmarks/stress_claims.py --mode db [--workers 4] [--threads 16]
+
+memory — конкурентные корутины через GameManager.register_click по движку процесса;
+db — несколько процессов с потоками бьют в claim_cell_in_db одной строки игры
+(нужен Postgres из DATABASE_URL).
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import Pool
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import game_engine  # noqa: E402
+from game_engine import CELLS_COUNT, GameEngine, claim_cell_in_db, empty_board  # noqa: E402
+
+PLAYERS = [("alice", "#FF0000"), ("bob", "#00FF00"), ("carol", "#0000FF"), ("dave", "#FFFF00")]
+
+
+def click_plan(clicks: int):
+    """Каждая клетка хотя бы раз, остальное — случайные повторы; порядок перемешан"""
+    coords = list(range(1, CELLS_COUNT + 1))
+    coords += [random.randint(1, CELLS_COUNT) for _ in range(max(0, clicks - CELLS_COUNT))]
+    random.shuffle(coords)
+    return [(random.choice(PLAYERS)[0], coord) for coord in coords]
+
+
+async def run_memory(games: int, clicks: int) -> None:
+    game_engine.CLAIM_MODE = "memory"
+    from utils import GameManager
+
+    async def click(game_id, username, coord):
+        await asyncio.sleep(random.random() / 1000)
+        return await GameManager(None, game_id).register_click(username, coord)
+
+    started = time.perf_counter()
+    for game_id in range(1, games + 1):
+        game_engine._engines[game_id] = GameEngine(game_id, PLAYERS)
+
+    results = await asyncio.gather(*(
+        click(game_id, username, coord)
+        for game_id in range(1, games + 1)
+        for username, coord in click_plan(clicks)
+    ))
+    elapsed = time.perf_counter() - started
+
+    per_game = {}
+    for result in results:
+        assert result["status"] == 200, result
+    for game_id in range(1, games + 1):
+        engine = game_engine.get_engine(game_id)
+        per_game[game_id] = sum(p.success_clicks for p in engine.slots)
+        assert engine.is_full and engine.grid.count(0) == 0
+
+    assert all(count == CELLS_COUNT for count in per_game.values()), per_game
+    print(f"memory: {games} games x {clicks} clicks in {elapsed:.2f}s, "
+          f"successes per game = {CELLS_COUNT} OK")
+
+
+def _db_worker(args):
+    game_id, plan, threads = args
+    from database import SessionLocal
+
+    def claim(item):
+        slot, coord = item
+        db = SessionLocal()
+        try:
+            return claim_cell_in_db(db, game_id, coord, slot)[0]
+        finally:
+            db.close()
+
+    with ThreadPoolExecutor(threads) as pool:
+        return sum(pool.map(claim, plan))
+
+
+def run_db(workers: int, threads: int, clicks: int) -> None:
+    from database import SessionLocal, dispose_after_fork, init_db
+    from models import Game
+
+    init_db()
+    db = SessionLocal()
+    # Занятие клеток работает по номерам слотов, состав игры в БД не нужен
+    game = Game(is_active=True, board=empty_board(),
+                claimed_cells=0, total_clicks=0, winners=[], game_state={"state": "active"})
+    db.add(game)
+    db.commit()
+    game_id = game.id
+    db.close()
+
+    plan = [(random.randint(1, len(PLAYERS)), coord) for _, coord in click_plan(clicks)]
+    chunks = [(game_id, plan[i::workers], threads) for i in range(workers)]
+
+    started = time.perf_counter()
+    # Пул соединений родителя уже открыт (init_db) — дочерние процессы заводят свои
+    with Pool(workers, initializer=dispose_after_fork) as pool:
+        successes = sum(pool.map(_db_worker, chunks))
+    elapsed = time.perf_counter() - started
+
+    db = SessionLocal()
+    try:
+        game = db.query(Game).get(game_id)
+        assert successes == CELLS_COUNT, successes
+        assert game.claimed_cells == CELLS_COUNT and game.board.count(0) == 0
+        print(f"db: {workers} workers x {threads} threads, {clicks} clicks in {elapsed:.2f}s, "
+              f"successes = {successes} OK")
+        db.delete(game)
+        db.commit()
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--mode", choices=("memory", "db"), default="memory")
+    parser.add_argument("--games", type=int, default=20)
+    parser.add_argument("--clicks", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=16)
+    args = parser.parse_args()
+    if args.mode == "memory":
+        asyncio.run(run_memory(args.games, args.clicks))
+    else:
+        run_db(args.workers, args.threads, args.clicks)
@@ -0,0 +1,185 @@
+# benchmarks/stress_cross_worker.py
+"""
+Проверка игры на нескольких воркерах (CLAIM_MODE=db, WORKER_NODES не задан).
+
+Запуск из каталога backend:
+    python benchmarks/stress_cross_worker.py [--workers 2] [--games 20] [--clicks 400]
+
+Каждый «воркер» — свой GameEngine одной игры и свой HubBackend на общем LocalHub,
+как отдельные процессы с общим брокером. Игроки кликают через разные воркеры
+(GameManager._apply_click), дельты публикуются в брокер, который доставляет их
+другим воркерам в случайном порядке. Клиенты каждого воркера применяют дельты
+по правилам game.html и при пропуске номера запрашивают снимок у своего воркера.
+
+Строка games заменена ее аналогом в памяти с той же семантикой, что _CLAIM_SQL
+(занятие клетки и общий total_clicks за один шаг), так что Postgres не нужен.
+В конце у каждого клиента и в снимке каждого воркера должно быть поле из «БД».
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import utils  # noqa: E402
+from game_engine import CELLS_COUNT, GameEngine, board_cells, claim_cell_in_db, empty_board  # noqa: E402
+from pubsub import HubBackend, LocalHub, game_channel  # noqa: E402
+from utils import GameManager  # noqa: E402
+
+GAME_ID = 1
+PLAYERS = [("alice", "#FF0000"), ("bob", "#00FF00"), ("carol", "#0000FF"), ("dave", "#FFFF00")]
+COLORS = [color for _, color in PLAYERS]
+
+
+class GameRow:
+    """Строка games в памяти: поле и общий счетчик кликов"""
+
+    def __init__(self):
+        self.board = bytearray(empty_board())
+        self.total_clicks = 0
+
+    def claim(self, db, game_id: int, coord: int, slot: int):
+        # Как _CLAIM_SQL: (is_success, владелец, занято клеток, номер клика)
+        previous = self.board[coord - 1]
+        if previous == 0:
+            self.board[coord - 1] = slot
+        self.total_clicks += 1
+        return previous == 0, self.board[coord - 1], CELLS_COUNT - self.board.count(0), self.total_clicks
+
+    def read(self):
+        return bytes(self.board), self.total_clicks
+
+
+class ShuffledHub(LocalHub):
+    """Брокер, доставляющий накопленные сообщения в случайном порядке"""
+
+    def __init__(self, rng: random.Random):
+        super().__init__()
+        self.rng = rng
+        self.queue = []
+
+    def publish(self, payload: str) -> None:
+        self.queue.append(payload)
+
+    def drain(self, limit: int) -> None:
+        for _ in range(min(limit, len(self.queue))):
+            payload = self.queue.pop(self.rng.randrange(len(self.queue)))
+            super().publish(payload)
+
+
+class Client:
+    """Логика applyDelta / applySnapshot из game.html"""
+
+    def __init__(self, worker: "Worker", snapshot: dict):
+        self.worker = worker
+        self.cells = {}
+        self.awaiting = False
+        self.resyncs = 0
+        self.apply_snapshot(snapshot)
+
+    def apply_snapshot(self, data: dict) -> None:
+        self.cells.update(data["cells"])
+        self.last_seq = data["seq"]
+        self.awaiting = False
+
+    def apply_delta(self, data: dict) -> None:
+        if self.awaiting or data["seq"] != self.last_seq + 1:
+            if data["is_success"]:
+                self.cells[str(data["coord"])] = data["color"]
+            if data["seq"] > self.last_seq + 1 and not self.awaiting:
+                self.awaiting = True
+                self.resyncs += 1
+                self.worker.resync.append(self)
+            return
+        self.last_seq = data["seq"]
+        if data["is_success"]:
+            self.cells[str(data["coord"])] = data["color"]
+
+    def receive(self, message: dict) -> None:
+        if message["type"] == "click_result":
+            self.apply_delta(message["data"])
+
+
+class Worker:
+    def __init__(self, row: GameRow, hub: LocalHub):
+        self.row = row
+        self.engine = GameEngine(GAME_ID, PLAYERS)
+        self.engine.board_in_db = True
+        self.backend = HubBackend(self.deliver, hub, on_remote=lambda channel, message: self.engine.mirror(message))
+        self.clients = []
+        self.resync = []
+
+    def deliver(self, channel: str, message: dict) -> None:
+        for client in self.clients:
+            client.receive(message)
+
+    def snapshot(self) -> dict:
+        # Как GameManager.snapshot в режиме db
+        self.engine.merge_board(*self.row.read())
+        return self.engine.snapshot()
+
+    async def click(self, username: str, coord: int) -> None:
+        result = await GameManager(None, GAME_ID)._apply_click(self.engine, username, coord)
+        assert result["status"] == 200, result
+        await self.backend.publish(game_channel(GAME_ID), {"type": "click_result", "data": result})
+
+    def answer_resyncs(self) -> None:
+        while self.resync:
+            client = self.resync.pop()
+            client.apply_snapshot(self.snapshot())
+
+
+async def run_game(args, rng: random.Random) -> int:
+    row = GameRow()
+    hub = ShuffledHub(rng)
+    workers = [Worker(row, hub) for _ in range(args.workers)]
+    for worker in workers:
+        await worker.backend.start()
+        worker.clients = [Client(worker, worker.snapshot()) for _ in range(2)]
+
+    coords = list(range(1, CELLS_COUNT + 1)) + [rng.randint(1, CELLS_COUNT) for _ in range(args.clicks)]
+    rng.shuffle(coords)
+    # Клетку занимает строка games в памяти вместо _CLAIM_SQL
+    utils.claim_cell_in_db = row.claim
+    try:
+        for coord in coords:
+            await rng.choice(workers).click(rng.choice(PLAYERS)[0], coord)
+            hub.drain(rng.randint(0, 3))
+            for worker in workers:
+                worker.answer_resyncs()
+    finally:
+        utils.claim_cell_in_db = claim_cell_in_db
+    hub.drain(len(hub.queue))
+    for worker in workers:
+        worker.answer_resyncs()
+
+    expected = board_cells(row.board, COLORS)
+    assert len(expected) == CELLS_COUNT
+    for index, worker in enumerate(workers):
+        snapshot = worker.snapshot()
+        assert snapshot["cells"] == expected, f"воркер {index}: снимок расходится с полем БД"
+        assert snapshot["seq"] == row.total_clicks, (snapshot["seq"], row.total_clicks)
+        for client in worker.clients:
+            assert client.cells == expected, f"клиент воркера {index} не видит клики других воркеров"
+        await worker.backend.stop()
+    return sum(client.resyncs for worker in workers for client in worker.clients)
+
+
+async def main(args) -> None:
+    rng = random.Random(args.seed)
+    resyncs = 0
+    for _ in range(args.games):
+        resyncs += await run_game(args, rng)
+    print(f"{args.games} games x {args.workers} workers: every client matches the DB board, "
+          f"{resyncs} resyncs")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--games", type=int, default=20)
+    parser.add_argument("--clicks", type=int, default=400)
+    parser.add_argument("--seed", type=int, default=1)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,135 @@
+# benchmarks/stress_settlement.py
+"""
+Стресс-проверка завершения игры: итоги подводятся ровно один раз.
+
+Запуск из каталога backend:
+    python benchmarks/stress_settlement.py --mode memory [--games 50] [--sockets 8]
+    python benchmarks/stress_settlement.py --mode db [--workers 8]
+
+memory — на заполненное поле одновременно приходят check_finish_game от
+--sockets сокетов с разными GameManager; подсчет итогов (без БД) должен
+выполниться один раз на игру, и результат получает один вызов;
+db — --workers процессов одновременно вызывают _finish_game одной игры,
+total_games/wins_count игроков должны вырасти ровно на 1
+(нужен Postgres из DATABASE_URL).
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from datetime import datetime
+from multiprocessing import Pool
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import game_engine  # noqa: E402
+from game_engine import CELLS_COUNT, GameEngine  # noqa: E402
+
+PLAYERS = [("alice", "#FF0000"), ("bob", "#00FF00")]
+PREFIX = "stress_settle_"
+
+
+async def run_memory(games: int, sockets: int) -> None:
+    from utils import GameManager
+
+    settled = {}
+
+    class CountingManager(GameManager):
+        """Подсчет итогов без БД: считаем, сколько раз он выполнился"""
+
+        async def finish_game(self):
+            await asyncio.sleep(random.random() / 100)
+            settled[self.game_id] = settled.get(self.game_id, 0) + 1
+            game_engine.drop_engine(self.game_id)
+            return {"status": 200, "winners": ["alice"]}
+
+    for game_id in range(1, games + 1):
+        engine = game_engine._engines[game_id] = GameEngine(game_id, PLAYERS)
+        for coord in range(1, CELLS_COUNT + 1):
+            engine.click(PLAYERS[coord % 2][0], coord)
+        assert engine.is_full
+
+    async def socket(game_id):
+        await asyncio.sleep(random.random() / 1000)
+        return await CountingManager(None, game_id).check_finish_game()
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(
+        socket(game_id) for game_id in range(1, games + 1) for _ in range(sockets)
+    ))
+    elapsed = time.perf_counter() - started
+
+    delivered = sum(1 for result in results if result is not None)
+    assert all(count == 1 for count in settled.values()) and len(settled) == games, settled
+    assert delivered == games, delivered
+    print(f"memory: {games} games x {sockets} sockets in {elapsed:.2f}s, "
+          f"settled once per game, {delivered} final broadcasts OK")
+
+
+def _db_worker(game_id):
+    from database import SessionLocal
+    from utils import GameManager
+
+    db = SessionLocal()
+    try:
+        return GameManager(db, game_id)._finish_game()["status"]
+    finally:
+        db.close()
+
+
+def run_db(workers: int) -> None:
+    from database import SessionLocal, dispose_after_fork, init_db
+    from models import Game, GamePlayer, PlayerStats, User, UserState
+
+    init_db()
+    db = SessionLocal()
+    users = [User(username=f"{PREFIX}{name}", password_hash="-", date_registration=datetime.utcnow(),
+                  total_games=0, wins_count=0, total_clicks=0, success_clicks=0, color_used=[])
+             for name, _ in PLAYERS]
+    db.add_all(users)
+    board = bytes(1 + coord % 2 for coord in range(CELLS_COUNT))
+    game = Game(is_active=True, board=board, claimed_cells=CELLS_COUNT, total_clicks=CELLS_COUNT,
+                winners=[], game_state={"state": "active"})
+    for slot, (user, (_, color)) in enumerate(zip(users, PLAYERS), start=1):
+        game.roster.append(GamePlayer(user=user, slot=slot, color=color))
+    db.add(game)
+    db.commit()
+    game_id, user_ids = game.id, [user.id for user in users]
+    db.close()
+
+    started = time.perf_counter()
+    # Пул соединений родителя уже открыт (init_db) — дочерние процессы заводят свои
+    with Pool(workers, initializer=dispose_after_fork) as pool:
+        statuses = pool.map(_db_worker, [game_id] * workers)
+    elapsed = time.perf_counter() - started
+
+    db = SessionLocal()
+    try:
+        assert statuses.count(200) == 1, statuses
+        for user in db.query(User).filter(User.id.in_(user_ids)):
+            assert user.total_games == 1, (user.username, user.total_games)
+        print(f"db: {workers} concurrent finishes in {elapsed:.2f}s, statuses={sorted(statuses)}, "
+              f"settled once OK")
+    finally:
+        db.query(PlayerStats).filter(PlayerStats.user_id.in_(user_ids)).delete(synchronize_session=False)
+        db.query(UserState).filter(UserState.game_id == game_id).delete(synchronize_session=False)
+        db.query(GamePlayer).filter(GamePlayer.game_id == game_id).delete(synchronize_session=False)
+        db.query(Game).filter(Game.id == game_id).delete(synchronize_session=False)
+        db.query(User).filter(User.id.in_(user_ids)).delete(synchronize_session=False)
+        db.commit()
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--mode", choices=("memory", "db"), default="memory")
+    parser.add_argument("--games", type=int, default=50)
+    parser.add_argument("--sockets", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+    if args.mode == "memory":
+        asyncio.run(run_memory(args.games, args.sockets))
+    else:
+        run_db(args.workers)
@@ -0,0 +1,226 @@
+# broadcast.py
+"""
+Рассылка сообщений группе WebSocket-клиентов.
+
+У каждого сокета своя ограниченная исходящая очередь и задача-писатель,
+поэтому рассылка только кладет уже сериализованное сообщение в очереди
+и не ждет медленных клиентов. При переполнении очереди действует политика:
+дельты состояния вытесняют самые старые дельты (клиент догонит через resync),
+управляющие сообщения отключают клиента. Соединения с бинарным подпротоколом
+(wire.py) получают дельты кликов бинарным кадром, остальные — JSON.
+"""
+import asyncio
+import json
+import logging
+import time
+from collections import deque
+from typing import Deque, Dict, Iterable, List, Optional, Set, Tuple, Union
+
+from starlette.websockets import WebSocket
+
+import metrics
+from config import (
+    CLIENT_QUEUE_SIZE,
+    BROADCAST_SEND_TIMEOUT,
+    DELTA_OVERFLOW_POLICY,
+    CONTROL_OVERFLOW_POLICY,
+)
+from wire import encode_binary
+
+logger = logging.getLogger(__name__)
+
+DROP_OLDEST = "drop_oldest"
+DISCONNECT = "disconnect"
+
+# Типы сообщений, которые можно терять: пропуск обнаруживается по seq
+DELTA_TYPES = {"click_result", "click_batch"}
+
+_CLOSE = None  # маркер завершения для писателя
+
+Payload = Union[str, bytes]
+
+
+def encode(message: dict) -> str:
+    """Сериализует сообщение так же, как WebSocket.send_json"""
+    return json.dumps(message, separators=(",", ":"), ensure_ascii=False)
+
+
+def payload_size(payload: Payload) -> int:
+    return len(payload) if isinstance(payload, bytes) else len(payload.encode())
+
+
+class ClientConnection:
+    """WebSocket с ограниченной исходящей очередью и собственной задачей-писателем"""
+
+    def __init__(self, websocket: WebSocket, queue_size: int = CLIENT_QUEUE_SIZE,
+                 send_timeout: float = BROADCAST_SEND_TIMEOUT, binary: bool = False):
+        self.websocket = websocket
+        # Бинарный подпротокол: дельты кликов кадрами wire.CLICK_FRAME
+        self.binary = binary
+        self.queue_size = queue_size
+        self.send_timeout = send_timeout
+        self.closed = False
+        self.sent = 0
+        self.dropped = 0
+        self.max_depth = 0
+        self._queue: Deque[Tuple[Optional[Payload], bool]] = deque()
+        self._wakeup = asyncio.Event()
+        self._writer: Optional[asyncio.Task] = None
+
+    @property
+    def depth(self) -> int:
+        return len(self._queue)
+
+    def start(self) -> "ClientConnection":
+        self._writer = asyncio.create_task(self._write_loop())
+        _connections.add(self)
+        return self
+
+    def send(self, message: dict) -> bool:
+        """Ставит сообщение в очередь отправки. Returns: False, если клиент отключен"""
+        return self.enqueue(self.encode(message), message.get("type") in DELTA_TYPES)
+
+    def encode(self, message: dict) -> Payload:
+        """Сообщение в формате соединения: бинарный кадр, если он есть у типа, иначе JSON"""
+        if self.binary:
+            frame = encode_binary(message)
+            if frame is not None:
+                return frame
+        return encode(message)
+
+    def enqueue(self, payload: Payload, droppable: bool) -> bool:
+        if self.closed:
+            return False
+
+        if len(self._queue) >= self.queue_size:
+            policy = DELTA_OVERFLOW_POLICY if droppable else CONTROL_OVERFLOW_POLICY
+            if policy != DROP_OLDEST or not self._drop_oldest(droppable):
+                logger.warning("Outbound queue overflow, disconnecting client")
+                self._abort()
+                return False
+            if len(self._queue) >= self.queue_size:
+                # Вытеснять нечего — теряем само новое сообщение
+                self.dropped += 1
+                return True
+
+        self._queue.append((payload, droppable))
+        self.max_depth = max(self.max_depth, len(self._queue))
+        self._wakeup.set()
+        return True
+
+    def _drop_oldest(self, droppable: bool) -> bool:
+        """Удаляет самую старую дельту из очереди"""
+        for index, (_, queued_droppable) in enumerate(self._queue):
+            if queued_droppable:
+                del self._queue[index]
+                self.dropped += 1
+                return True
+        return droppable
+
+    async def _write_loop(self) -> None:
+        try:
+            while True:
+                while not self._queue:
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                payload, _ = self._queue.popleft()
+                if payload is _CLOSE:
+                    return
+                if isinstance(payload, bytes):
+                    await asyncio.wait_for(self.websocket.send_bytes(payload), self.send_timeout)
+                else:
+                    await asyncio.wait_for(self.websocket.send_text(payload), self.send_timeout)
+                self.sent += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Client disconnected or error sending: {e!r}")
+            self._abort()
+
+    def _abort(self) -> None:
+        """Отключает клиента, не дожидаясь отправки очереди"""
+        if self.closed:
+            return
+        self.closed = True
+        self._queue.clear()
+        _connections.discard(self)
+        if self._writer and self._writer is not asyncio.current_task():
+            self._writer.cancel()
+        asyncio.create_task(_close_socket(self.websocket, 1013))
+
+    async def close(self, timeout: float = BROADCAST_SEND_TIMEOUT) -> None:
+        """Дописывает очередь (не дольше timeout) и останавливает писателя"""
+        if self.closed:
+            return
+        self.closed = True
+        _connections.discard(self)
+        if self._writer is None:
+            return
+        self._queue.append((_CLOSE, False))
+        self._wakeup.set()
+        try:
+            await asyncio.wait_for(self._writer, timeout)
+        except Exception:
+            self._writer.cancel()
+
+    def stats(self) -> Dict:
+        return {
+            "depth": self.depth,
+            "max_depth": self.max_depth,
+            "sent": self.sent,
+            "dropped": self.dropped
+        }
+
+
+async def _close_socket(ws: WebSocket, code: int) -> None:
+    try:
+        await ws.close(code=code)
+    except Exception:
+        pass
+
+
+# Все живые соединения процесса — для метрик очередей
+_connections: Set[ClientConnection] = set()
+
+
+def fan_out(clients: Iterable[ClientConnection], message: dict) -> List[ClientConnection]:
+    """
+    Сериализует сообщение один раз на формат (JSON / бинарный кадр)
+    и ставит его в очереди всех клиентов
+    Returns:
+        клиенты, которые отключены (их нужно убрать из комнаты)
+    """
+    clients = list(clients)
+    if not clients:
+        return []
+
+    if metrics.ENABLED:
+        started = time.perf_counter()
+    droppable = message.get("type") in DELTA_TYPES
+    payloads: Dict[bool, Payload] = {}
+    closed = []
+    for conn in clients:
+        payload = payloads.get(conn.binary)
+        if payload is None:
+            payload = payloads[conn.binary] = conn.encode(message)
+        if not conn.enqueue(payload, droppable):
+            closed.append(conn)
+    if metrics.ENABLED:
+        metrics.BROADCAST_SECONDS.observe(time.perf_counter() - started)
+        for payload in payloads.values():
+            metrics.BROADCAST_BYTES.observe(payload_size(payload))
+        metrics.BROADCAST_DELIVERIES.inc(len(clients) - len(closed))
+    return closed
+
+
+def queue_stats() -> Dict:
+    """Метрики исходящих очередей всех соединений"""
+    depths = [conn.depth for conn in _connections]
+    return {
+        "connections": len(depths),
+        "queued": sum(depths),
+        "max_depth": max(depths, default=0),
+        "high_watermark": max((conn.max_depth for conn in _connections), default=0),
+        "dropped": sum(conn.dropped for conn in _connections),
+        "queue_size": CLIENT_QUEUE_SIZE
+    }
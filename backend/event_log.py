@@ -0,0 +1,125 @@
+# event_log.py
+"""
+Журнал игровых событий без дискового ввода-вывода в цикле событий.
+
+Логгер только кладет запись в ограниченную очередь (QueueHandler), а в файл
+ее пишет фоновый поток QueueListener. Записи — JSON в одну строку с полями
+события (game_id, username, action, latency_ms ...). Частые события (клики)
+пишутся с выборкой LOG_CLICK_SAMPLE_RATE (ошибки и предупреждения — всегда). Если очередь переполнена, запись
+отбрасывается и учитывается в stats(), а не ждет диска.
+"""
+import atexit
+import json
+import logging
+import queue
+import random
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Dict, Optional
+
+from config import LOG_CLICK_SAMPLE_RATE, LOG_FILE, LOG_QUEUE_SIZE
+
+# Доля записываемых событий по типу; остальные события пишутся все
+SAMPLE_RATES = {"click": LOG_CLICK_SAMPLE_RATE}
+
+
+class JsonFormatter(logging.Formatter):
+    """Запись лога одной строкой JSON; поля события берутся из record.event"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        event = getattr(record, "event", None)
+        if event:
+            data.update(event)
+        if record.exc_info:
+            data["exc"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler, который при полной очереди теряет запись вместо ожидания"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_queue: queue.Queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+_handler = DroppingQueueHandler(_queue)
+_listener: Optional[QueueListener] = None
+_sampled_out = 0
+
+
+def setup(path: str = LOG_FILE) -> None:
+    """Запускает фоновую запись в файл (повторный вызов ничего не делает)"""
+    global _listener
+    if _listener is not None:
+        return
+    file_handler = RotatingFileHandler(path, maxBytes=1_000_000, backupCount=5)
+    file_handler.setFormatter(JsonFormatter())
+    _listener = QueueListener(_queue, file_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown)
+
+
+def shutdown() -> None:
+    """Дописывает очередь и останавливает поток записи"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Логгер, пишущий через очередь в журнал событий"""
+    logger = logging.getLogger(name)
+    if _handler not in logger.handlers:
+        logger.addHandler(_handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+    setup()
+    return logger
+
+
+def log_event(logger: logging.Logger, action: str, message: str = "", level: int = logging.INFO,
+              **fields) -> None:
+    """
+    Пишет событие с полями; события из SAMPLE_RATES ниже WARNING — с выборкой,
+    предупреждения и ошибки пишутся всегда.
+    latency передается в секундах и пишется как latency_ms.
+    """
+    global _sampled_out
+    rate = SAMPLE_RATES.get(action, 1.0) if level < logging.WARNING else 1.0
+    if rate < 1.0 and random.random() >= rate:
+        _sampled_out += 1
+        return
+    if not logger.isEnabledFor(level):
+        return
+
+    latency = fields.pop("latency", None)
+    if latency is not None:
+        fields["latency_ms"] = round(latency * 1000, 3)
+    if rate < 1.0:
+        fields["sample_rate"] = rate
+    logger.log(level, message or action, extra={"event": {"action": action, **fields}})
+
+
+def stats() -> Dict:
+    return {
+        "queued": _queue.qsize(),
+        "queue_size": LOG_QUEUE_SIZE,
+        "dropped": _handler.dropped,
+        "sampled_out": _sampled_out,
+        "click_sample_rate": LOG_CLICK_SAMPLE_RATE
+    }
@@ -0,0 +1,506 @@
+# game_engine.py
+"""
+Игровой движок в памяти процесса.
+
+Живое состояние активной игры (поле 10x10 и счетчики игроков) хранится
+здесь, а в БД (Game / UserState / User) попадает пачками в фоне
+(write-behind) и при завершении игры.
+
+При CLAIM_MODE=db поле и номер клика (seq) авторитетны в строке games, общей
+для всех воркеров; движок — зеркало, которое дополняется дельтами других
+воркеров (mirror_remote) и полем из БД при снимке.
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import bindparam, text, update
+from sqlalchemy.orm import Session, joinedload
+
+from config import CLAIM_MODE, ROOM_IDLE_TIMEOUT
+from database import run_in_session, session_scope
+from models import Game, User, UserState
+from roster import Roster
+
+logger = logging.getLogger(__name__)
+
+GRID_SIZE = 10
+CELLS_COUNT = GRID_SIZE * GRID_SIZE
+
+
+def empty_board() -> bytes:
+    """Поле для Game.board: байт на клетку, 0 — свободна, иначе номер слота владельца (с 1)"""
+    return bytes(CELLS_COUNT)
+
+
+def board_cells(board: bytes, colors: List[str]) -> Dict[str, str]:
+    """Клетки поля в формате {"coord": color}; colors — цвета игроков по слотам"""
+    cells = {}
+    for index, slot in enumerate(board or b""):
+        if slot and slot <= len(colors):
+            cells[str(index + 1)] = colors[slot - 1]
+    return cells
+
+
+class PlayerCounters:
+    """Счетчики игрока: итоговые и еще не записанные в БД"""
+
+    __slots__ = (
+        "username", "color", "slot", "user_id", "state_id",
+        "total_clicks", "success_clicks", "failed_clicks",
+        "pending_total", "pending_success", "pending_failed",
+    )
+
+    def __init__(self, username: str, color: str, slot: int):
+        self.username = username
+        self.color = color
+        self.slot = slot
+        # Ключи строк users / user_states: запись идет по ним, без поиска по имени
+        self.user_id: Optional[int] = None
+        self.state_id: Optional[int] = None
+        self.total_clicks = 0
+        self.success_clicks = 0
+        self.failed_clicks = 0
+        self.pending_total = 0
+        self.pending_success = 0
+        self.pending_failed = 0
+
+    def as_dict(self) -> Dict:
+        return {
+            "username": self.username,
+            "color": self.color,
+            "total_clicks": self.total_clicks,
+            "success_clicks": self.success_clicks,
+            "failed_clicks": self.failed_clicks
+        }
+
+
+class GameEngine:
+    """
+    Авторитетное состояние одной игры.
+    grid[i] == 0 — клетка i+1 свободна, иначе номер слота владельца (с 1).
+    """
+
+    def __init__(self, game_id: int, players: List[Tuple[str, str]]):
+        self.game_id = game_id
+        self.grid = bytearray(CELLS_COUNT)
+        self.slots: List[PlayerCounters] = []
+        self.players: Dict[str, PlayerCounters] = {}
+        for username, color in players:
+            self._add_slot(username, color)
+        self.total_clicks = 0
+        self.claimed = 0
+        self.is_active = True
+        # Версия состояния: растет на каждый клик, по ней клиент находит пропуски дельт.
+        # В режиме db это games.total_clicks — общий счетчик всех воркеров
+        self.seq = 0
+        self._pending_clicks = 0
+        # Последнее обращение к движку: по нему простаивающая игра выгружается (flush_all)
+        self.last_active = time.monotonic()
+        # Записи в БД одного движка не должны пересекаться (фон и завершение игры)
+        self.flush_lock = asyncio.Lock()
+        # Клики одной игры применяются строго по очереди
+        self.claim_lock = asyncio.Lock()
+        # В режиме db поле авторитетно в БД (несколько воркеров), движок лишь его зеркало
+        self.board_in_db = CLAIM_MODE == "db"
+
+    def _add_slot(self, username: str, color: str) -> PlayerCounters:
+        counters = PlayerCounters(username, color, len(self.slots) + 1)
+        self.slots.append(counters)
+        self.players[username] = counters
+        return counters
+
+    @classmethod
+    def from_game(cls, game: Game, user_states: Dict[str, UserState]) -> "GameEngine":
+        """
+        Восстанавливает движок из сохраненного состояния игры
+        Args:
+            user_states: {username: UserState} для этой игры
+        """
+        engine = cls(game.id, list(Roster.from_game(game)))
+        engine.total_clicks = game.total_clicks or 0
+        engine.seq = engine.total_clicks
+        engine.is_active = bool(game.is_active)
+
+        for username, state in user_states.items():
+            counters = engine.players.get(username)
+            if counters is None:
+                continue
+            counters.user_id = state.user_id
+            counters.state_id = state.id
+            counters.total_clicks = state.total_clicks or 0
+            counters.success_clicks = state.success_clicks or 0
+            counters.failed_clicks = state.failed_clicks or 0
+
+        if game.board:
+            engine.grid[:] = game.board
+        engine.claimed = CELLS_COUNT - engine.grid.count(0)
+        return engine
+
+    @property
+    def is_full(self) -> bool:
+        return self.claimed >= CELLS_COUNT
+
+    @property
+    def is_dirty(self) -> bool:
+        return self._pending_clicks > 0
+
+    def touch(self) -> None:
+        self.last_active = time.monotonic()
+
+    def is_idle(self, timeout: float) -> bool:
+        """Нет кликов и обращений дольше timeout и нет незаписанных изменений"""
+        return (time.monotonic() - self.last_active >= timeout
+                and not self.is_dirty and not self.claim_lock.locked())
+
+    def click(self, username: str, coord: int) -> Tuple[bool, PlayerCounters]:
+        """
+        Применяет клик к полю. Только операции в памяти.
+        Raises:
+            KeyError: игрок не участвует в игре
+        """
+        counters = self.players[username]
+        is_success = self.grid[coord - 1] == 0
+        return self.record_click(counters, coord, is_success, counters.slot), counters
+
+    def record_click(self, counters: PlayerCounters, coord: int, is_success: bool,
+                     owner_slot: int, claimed: Optional[int] = None, seq: Optional[int] = None) -> bool:
+        """
+        Учитывает клик, исход которого уже решен (в памяти или условным UPDATE в БД)
+        Args:
+            owner_slot: слот владельца клетки после клика
+            claimed: число занятых клеток по данным БД, если известно
+            seq: номер клика в игре по данным БД (games.total_clicks), если известен
+        """
+        self.last_active = time.monotonic()
+        if seq is None:
+            self.total_clicks += 1
+            self.seq += 1
+        else:
+            # Клики других воркеров могли уже продвинуть зеркало дальше
+            self.total_clicks = max(self.total_clicks, seq)
+            self.seq = max(self.seq, seq)
+        self._pending_clicks += 1
+        counters.total_clicks += 1
+        counters.pending_total += 1
+
+        if self.grid[coord - 1] == 0 and owner_slot:
+            self.grid[coord - 1] = owner_slot
+            self.claimed += 1
+        if claimed is not None:
+            self.claimed = max(self.claimed, claimed)
+
+        if is_success:
+            counters.success_clicks += 1
+            counters.pending_success += 1
+        else:
+            counters.failed_clicks += 1
+            counters.pending_failed += 1
+
+        return is_success
+
+    def apply_remote(self, delta: Dict) -> None:
+        """
+        Переносит в зеркало дельту клика другого воркера (режим db).
+        Клетка, занятая однажды, владельца не меняет, поэтому порядок дельт не важен.
+        """
+        slot = delta.get("slot")
+        if not slot or slot > len(self.slots):
+            return
+        coord = delta["coord"]
+        if delta["is_success"] and self.grid[coord - 1] == 0:
+            self.grid[coord - 1] = slot
+            self.claimed += 1
+        game = delta["game_stats"]
+        self.claimed = max(self.claimed, game["clicked_cells"])
+        self.total_clicks = max(self.total_clicks, game["total_clicks"])
+        self.seq = max(self.seq, delta["seq"])
+
+        # Счетчики игрока ведет воркер, через который он кликает; pending не трогаем
+        counters = self.slots[slot - 1]
+        stats = delta["player_stats"]
+        if stats["total_clicks"] >= counters.total_clicks:
+            counters.total_clicks = stats["total_clicks"]
+            counters.success_clicks = stats["success_clicks"]
+            counters.failed_clicks = stats["failed_clicks"]
+
+    def mirror(self, message: Dict) -> None:
+        """Переносит в зеркало сообщение click_result / click_batch другого воркера"""
+        kind = message.get("type")
+        if kind == "click_result":
+            self.apply_remote(message["data"])
+        elif kind == "click_batch":
+            for delta in message["data"]:
+                self.apply_remote(delta)
+
+    def merge_board(self, board: bytes, total_clicks: int) -> None:
+        """Дополняет зеркало полем из БД (режим db): клетки, занятые через другие воркеры"""
+        for index, slot in enumerate(board or b""):
+            if slot and not self.grid[index]:
+                self.grid[index] = slot
+        self.claimed = CELLS_COUNT - self.grid.count(0)
+        self.total_clicks = max(self.total_clicks, total_clicks)
+        self.seq = max(self.seq, total_clicks)
+
+    def cells_state(self) -> Dict[str, str]:
+        """Клетки в формате {"coord": color}"""
+        return board_cells(self.grid, [p.color for p in self.slots])
+
+    def game_stats(self) -> Dict:
+        return {
+            "total_clicks": self.total_clicks,
+            "clicked_cells": self.claimed
+        }
+
+    def snapshot(self) -> Dict:
+        """Полное состояние для (пере)синхронизации клиента"""
+        return {
+            "seq": self.seq,
+            "is_active": self.is_active,
+            "cells": self.cells_state(),
+            "players": [p.as_dict() for p in self.slots],
+            "game_stats": self.game_stats()
+        }
+
+    def flush(self, db: Session) -> bool:
+        """
+        Записывает накопленные изменения одной транзакцией.
+        Returns:
+            True, если что-то было записано
+        """
+        if not self.is_dirty:
+            return False
+
+        pending_clicks, self._pending_clicks = self._pending_clicks, 0
+        board = bytes(self.grid)
+        pending = [(p, p.pending_total, p.pending_success, p.pending_failed) for p in self.slots]
+        for p in self.slots:
+            p.pending_total = p.pending_success = p.pending_failed = 0
+
+        try:
+            # В режиме db поле и games.total_clicks пишет сам клик (claim_cell_in_db)
+            if not self.board_in_db:
+                # Счетчик увеличивается выражением в SQL, чтобы записи разных процессов не терялись;
+                # поле пишется целиком: фиксированные CELLS_COUNT байт независимо от числа кликов
+                updated = db.execute(
+                    update(Game).where(Game.id == self.game_id)
+                    .values(total_clicks=Game.total_clicks + pending_clicks,
+                            board=board, claimed_cells=CELLS_COUNT - board.count(0))
+                    .execution_options(synchronize_session=False)
+                )
+                if not updated.rowcount:
+                    raise ValueError(f"Игра {self.game_id} не найдена")
+
+            # Строки игроков известны по ключам из состава — по одному executemany на таблицу
+            changed = [(p, total, success, failed) for p, total, success, failed in pending
+                       if total and p.state_id is not None]
+            if changed:
+                db.execute(_STATE_INCREMENT, [
+                    {"state_id": p.state_id, "total": total, "success": success, "failed": failed}
+                    for p, total, success, failed in changed
+                ])
+                db.execute(_USER_INCREMENT, [
+                    {"user_id": p.user_id, "total": total, "success": success}
+                    for p, total, success, failed in changed
+                ])
+
+            db.commit()
+            return True
+
+        except Exception:
+            db.rollback()
+            # Возвращаем несохраненные изменения, чтобы записать их в следующий раз
+            self._pending_clicks += pending_clicks
+            for counters, total, success, failed in pending:
+                counters.pending_total += total
+                counters.pending_success += success
+                counters.pending_failed += failed
+            raise
+
+
+_STATE_INCREMENT = (
+    update(UserState.__table__)
+    .where(UserState.__table__.c.id == bindparam("state_id"))
+    .values(
+        total_clicks=UserState.__table__.c.total_clicks + bindparam("total"),
+        success_clicks=UserState.__table__.c.success_clicks + bindparam("success"),
+        failed_clicks=UserState.__table__.c.failed_clicks + bindparam("failed"),
+    )
+)
+
+_USER_INCREMENT = (
+    update(User.__table__)
+    .where(User.__table__.c.id == bindparam("user_id"))
+    .values(
+        total_clicks=User.__table__.c.total_clicks + bindparam("total"),
+        success_clicks=User.__table__.c.success_clicks + bindparam("success"),
+    )
+)
+
+# Каждый клик, успешный или нет, увеличивает games.total_clicks: это общий для
+# всех воркеров номер клика (seq), по которому клиенты упорядочивают дельты.
+# Завершенная игра (is_active = false) строк не дает — клик отклоняется
+_CLAIM_SQL = text("""
+    WITH cell AS (
+        SELECT get_byte(board, :index) AS owner FROM games
+        WHERE id = :game_id AND is_active
+        FOR UPDATE
+    )
+    UPDATE games
+    SET board = CASE WHEN cell.owner = 0 THEN set_byte(board, :index, :slot) ELSE board END,
+        claimed_cells = claimed_cells + CASE WHEN cell.owner = 0 THEN 1 ELSE 0 END,
+        total_clicks = COALESCE(total_clicks, 0) + 1
+    FROM cell
+    WHERE games.id = :game_id
+    RETURNING cell.owner, get_byte(games.board, :index), games.claimed_cells, games.total_clicks
+""")
+
+_BOARD_SQL = text("""
+    SELECT board, COALESCE(total_clicks, 0) FROM games WHERE id = :game_id
+""")
+
+
+def claim_cell_in_db(db: Session, game_id: int, coord: int,
+                     slot: int) -> Optional[Tuple[bool, int, int, int]]:
+    """
+    Атомарно занимает клетку одним UPDATE (строка игры блокируется на время записи),
+    корректно при нескольких воркерах.
+    Returns:
+        (is_success, слот владельца, число занятых клеток, номер клика в игре)
+        или None, если игра уже завершена (ничего не записано)
+    """
+    params = {"game_id": game_id, "index": coord - 1, "slot": slot}
+    try:
+        row = db.execute(_CLAIM_SQL, params).first()
+        db.commit()
+        if row is None:
+            return None
+        previous, owner, claimed, seq = row
+        return previous == 0, owner, claimed, seq
+    except Exception:
+        db.rollback()
+        raise
+
+
+def read_board(db: Session, game_id: int) -> Tuple[bytes, int]:
+    """Поле и число кликов игры из БД (режим db). Returns: (board, total_clicks)"""
+    board, total_clicks = db.execute(_BOARD_SQL, {"game_id": game_id}).one()
+    db.commit()
+    return bytes(board), total_clicks
+
+
+# --- Реестр движков процесса ---
+_engines: Dict[int, GameEngine] = {}
+_load_locks: Dict[int, asyncio.Lock] = {}
+# Выгружено простаивающих движков (брошенные игры)
+_evicted = 0
+
+
+def get_engine(game_id: int) -> Optional[GameEngine]:
+    return _engines.get(game_id)
+
+
+def engine_load_lock(game_id: int) -> asyncio.Lock:
+    """Блокировка загрузки движка: игра поднимается из БД ровно один раз"""
+    return _load_locks.setdefault(game_id, asyncio.Lock())
+
+
+def load_roster(db: Session, game: Game) -> Dict[str, UserState]:
+    """
+    Состав игры одним запросом: UserState вместе с User, по имени игрока.
+    Недостающие состояния (игры, начатые до создания их при старте) добавляются пачкой.
+    """
+    roster = {
+        state.user.username: state for state in
+        db.query(UserState).options(joinedload(UserState.user))
+        .filter(UserState.game_id == game.id).all()
+    }
+
+    missing = [player for player in game.roster if player.user.username not in roster]
+    if missing:
+        for player in missing:
+            state = UserState(game_id=game.id, user_id=player.user_id, user=player.user, color=player.color,
+                              total_clicks=0, success_clicks=0, failed_clicks=0, joined_at=datetime.utcnow())
+            db.add(state)
+            roster[player.user.username] = state
+        db.commit()
+    return roster
+
+
+def load_engine(db: Session, game: Game) -> GameEngine:
+    """Возвращает движок игры, при необходимости поднимая его из БД вместе с составом"""
+    engine = _engines.get(game.id)
+    if engine is None:
+        engine = GameEngine.from_game(game, load_roster(db, game))
+        _engines[game.id] = engine
+    return engine
+
+
+def drop_engine(game_id: int) -> None:
+    _engines.pop(game_id, None)
+    _load_locks.pop(game_id, None)
+
+
+def mirror_remote(channel: str, message: Dict) -> None:
+    """
+    Дельты кликов, пришедшие от других воркеров, переносятся в зеркало движка,
+    чтобы снимок (resync) этого воркера содержал и их клетки
+    """
+    if not channel.startswith("game:"):
+        return
+    engine = _engines.get(int(channel.split(":", 1)[1]))
+    if engine is not None and engine.board_in_db:
+        engine.mirror(message)
+
+
+async def flush_engine(engine: GameEngine) -> bool:
+    """Записывает изменения движка в отдельной сессии"""
+    async with engine.flush_lock:
+        if not engine.is_dirty:
+            return False
+        async with session_scope() as session:
+            return await run_in_session(session, engine.flush)
+
+
+async def flush_all(in_use: Optional[Callable[[int], bool]] = None,
+                    idle_timeout: float = ROOM_IDLE_TIMEOUT) -> int:
+    """
+    Записывает все движки с изменениями. Если задан in_use, движки игр без
+    соединений (in_use(game_id) ложно) и без кликов дольше idle_timeout
+    после записи выгружаются — брошенные игры не копятся в памяти.
+    Returns:
+        число записанных игр
+    """
+    global _evicted
+    flushed = 0
+    for engine in list(_engines.values()):
+        try:
+            if await flush_engine(engine):
+                flushed += 1
+        except Exception as e:
+            logger.error(f"Ошибка записи состояния игры {engine.game_id}: {e}")
+            continue
+        # Проверка после await и выгрузка — без await между ними
+        if (in_use is not None and _engines.get(engine.game_id) is engine
+                and engine.is_idle(idle_timeout) and not in_use(engine.game_id)):
+            drop_engine(engine.game_id)
+            _evicted += 1
+    return flushed
+
+
+async def flush_loop(interval: float, in_use: Optional[Callable[[int], bool]] = None) -> None:
+    """Фоновая задача write-behind: периодически сбрасывает изменения в БД и выгружает простаивающие игры"""
+    while True:
+        await asyncio.sleep(interval)
+        await flush_all(in_use)
+
+
+def stats() -> Dict:
+    return {
+        "engines": len(_engines),
+        "dirty": sum(1 for engine in _engines.values() if engine.is_dirty),
+        "evicted": _evicted,
+        "idle_timeout": ROOM_IDLE_TIMEOUT
+    }
@@ -0,0 +1,76 @@
+# identity.py
+"""
+Кэш личности авторизованного пользователя.
+
+В подписанной сессии хранится id и имя пользователя, а снимок профиля
+(Identity) — в LRU-кэше процесса с TTL по id. Защищенные страницы берут
+пользователя из кэша и идут в БД только при промахе. При изменении профиля
+запись сбрасывается через invalidate.
+"""
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from config import IDENTITY_CACHE_SIZE, IDENTITY_CACHE_TTL
+
+
+class Identity:
+    """Снимок профиля, достаточный для страниц и сокетов"""
+
+    __slots__ = ("id", "username", "color")
+
+    def __init__(self, id: int, username: str, color: Optional[str] = None):
+        self.id = id
+        self.username = username
+        self.color = color
+
+    @classmethod
+    def from_user(cls, user) -> "Identity":
+        return cls(user.id, user.username, user.color)
+
+    def session_data(self) -> Dict:
+        """Что кладется в подписанную сессию"""
+        return {"id": self.id, "username": self.username}
+
+
+class IdentityCache:
+    """LRU по id пользователя с ограничением времени жизни записи"""
+
+    def __init__(self, maxsize: int = IDENTITY_CACHE_SIZE, ttl: float = IDENTITY_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._items: "OrderedDict[int, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id: int) -> Optional[Identity]:
+        item = self._items.get(user_id)
+        if item is None or item[1] < time.monotonic():
+            if item is not None:
+                del self._items[user_id]
+            self.misses += 1
+            return None
+        self._items.move_to_end(user_id)
+        self.hits += 1
+        return item[0]
+
+    def put(self, identity: Identity) -> None:
+        self._items[identity.id] = (identity, time.monotonic() + self.ttl)
+        self._items.move_to_end(identity.id)
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+
+    def invalidate(self, user_id: int) -> None:
+        self._items.pop(user_id, None)
+
+    def stats(self) -> Dict:
+        return {
+            "size": len(self._items),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+
+identity_cache = IdentityCache()
@@ -0,0 +1,208 @@
+# leaderboard.py
+"""
+Рейтинг игроков.
+
+Агрегаты игрока (PlayerStats) обновляются один раз при завершении игры,
+в той же транзакции, поэтому профиль читает одну строку по ключу, а рейтинг —
+страницу по индексу ix_player_stats_rank (wins, success_ratio, user_id)
+без просмотра всей таблицы. Следующая страница запрашивается курсором —
+ключом последней строки. Страницы кэшируются до завершения очередной игры:
+сообщение finish_game доходит до всех воркеров через брокер рассылок, и каждый
+сбрасывает свой кэш; без брокера (или если сообщение потеряно) устаревание
+ограничено LEADERBOARD_CACHE_TTL.
+"""
+import base64
+import json
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import Float, and_, bindparam, case, cast, or_, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from config import LEADERBOARD_CACHE_TTL
+from models import PlayerStats
+
+MAX_PAGE_SIZE = 100
+# Разных страниц в кэше (курсоры не ограничены, поэтому кэш периодически чистится)
+MAX_CACHED_PAGES = 1000
+
+# Порядок рейтинга — тот же, что у индекса ix_player_stats_rank
+RANK_ORDER = (PlayerStats.wins.desc(), PlayerStats.success_ratio.desc(), PlayerStats.user_id)
+
+
+class GameResult:
+    """Итог игры для одного игрока"""
+
+    __slots__ = ("user_id", "username", "color", "total_clicks", "success_clicks", "is_winner")
+
+    def __init__(self, user_id: int, username: str, color: str,
+                 total_clicks: int, success_clicks: int, is_winner: bool):
+        self.user_id = user_id
+        self.username = username
+        self.color = color
+        self.total_clicks = total_clicks
+        self.success_clicks = success_clicks
+        self.is_winner = is_winner
+
+
+_STATS = PlayerStats.__table__
+
+_SET_COLORS = (
+    update(_STATS)
+    .where(_STATS.c.user_id == bindparam("key"))
+    .values(color_counts=bindparam("color_counts"), favourite_color=bindparam("favourite_color"))
+)
+
+
+def record_results(db: Session, results: Iterable[GameResult]) -> None:
+    """
+    Добавляет итоги игры к агрегатам игроков. Коммит и сброс leaderboard_cache — за вызывающим.
+    Счетчики — одним INSERT ... ON CONFLICT DO UPDATE: первая игра игрока не упирается
+    в уникальный ключ параллельной, а строки остаются заблокированными до конца
+    транзакции. Цвета (JSON) дописываются вторым запросом по значениям из RETURNING.
+    """
+    # Один порядок блокировок строк у всех транзакций — без взаимных блокировок
+    results = sorted(results, key=lambda r: r.user_id)
+    if not results:
+        return
+    now = datetime.utcnow()
+    stmt = insert(_STATS).values([
+        {
+            "user_id": r.user_id, "username": r.username, "games_played": 1, "wins": int(r.is_winner),
+            "total_clicks": r.total_clicks, "success_clicks": r.success_clicks,
+            "success_ratio": r.success_clicks / r.total_clicks if r.total_clicks else 0.0,
+            "color_counts": {}, "updated_at": now
+        }
+        for r in results
+    ])
+    total = _STATS.c.total_clicks + stmt.excluded.total_clicks
+    success = _STATS.c.success_clicks + stmt.excluded.success_clicks
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[_STATS.c.user_id],
+        set_={
+            "games_played": _STATS.c.games_played + 1,
+            "wins": _STATS.c.wins + stmt.excluded.wins,
+            "total_clicks": total,
+            "success_clicks": success,
+            "success_ratio": case((total > 0, cast(success, Float) / cast(total, Float)), else_=0.0),
+            "updated_at": stmt.excluded.updated_at
+        }
+    ).returning(_STATS.c.user_id, _STATS.c.color_counts, _STATS.c.favourite_color)
+    current = {user_id: (counts, favourite) for user_id, counts, favourite in db.execute(stmt)}
+
+    colors = []
+    for r in results:
+        counts, favourite = current[r.user_id]
+        counts = dict(counts or {})
+        counts[r.color] = counts.get(r.color, 0) + 1
+        if counts[r.color] > counts.get(favourite, 0):
+            favourite = r.color
+        colors.append({"key": r.user_id, "color_counts": counts, "favourite_color": favourite})
+    db.execute(_SET_COLORS, colors)
+
+
+def get_player_stats(db: Session, user_id: int) -> Optional[PlayerStats]:
+    return db.get(PlayerStats, user_id)
+
+
+def encode_cursor(row: PlayerStats, rank: int) -> str:
+    raw = json.dumps([row.wins, row.success_ratio, row.user_id, rank])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[int, float, int, int]:
+    """
+    Raises:
+        ValueError: курсор поврежден
+    """
+    try:
+        wins, ratio, user_id, rank = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return int(wins), float(ratio), int(user_id), int(rank)
+    except Exception as e:
+        raise ValueError("Некорректный курсор") from e
+
+
+def _entry(row: PlayerStats, rank: int) -> Dict:
+    return {
+        "rank": rank,
+        "username": row.username,
+        "wins": row.wins,
+        "games_played": row.games_played,
+        "success_ratio": round(row.success_ratio, 4),
+        "favourite_color": row.favourite_color
+    }
+
+
+def leaderboard_page(db: Session, limit: int = 20, cursor: Optional[str] = None,
+                     page: Optional[int] = None) -> Dict:
+    """
+    Страница рейтинга: по курсору (ключ последней строки предыдущей страницы)
+    или по номеру страницы с 1 (OFFSET — только для первых страниц)
+    Returns:
+        {"items": [...], "next_cursor": str | None}
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    query = db.query(PlayerStats).order_by(*RANK_ORDER)
+    rank = 0
+
+    if cursor:
+        wins, ratio, user_id, rank = decode_cursor(cursor)
+        # Строки «после» курсора в порядке (wins DESC, success_ratio DESC, user_id ASC)
+        query = query.filter(or_(
+            PlayerStats.wins < wins,
+            and_(PlayerStats.wins == wins, PlayerStats.success_ratio < ratio),
+            and_(PlayerStats.wins == wins, PlayerStats.success_ratio == ratio,
+                 PlayerStats.user_id > user_id)
+        ))
+    elif page and page > 1:
+        rank = (page - 1) * limit
+        query = query.offset(rank)
+
+    rows = query.limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    items: List[Dict] = [_entry(row, rank + n) for n, row in enumerate(rows, start=1)]
+    return {
+        "items": items,
+        "next_cursor": encode_cursor(rows[-1], rank + len(rows)) if has_more else None
+    }
+
+
+class LeaderboardCache:
+    """Кэш страниц рейтинга; сбрасывается целиком при записи итогов игры"""
+
+    def __init__(self, ttl: float = LEADERBOARD_CACHE_TTL):
+        self.ttl = ttl
+        self._pages: Dict[tuple, Tuple[Dict, float]] = {}
+        # Растет при каждом сбросе: страницу, прочитанную до сброса, не кэшируем
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: tuple) -> Optional[Dict]:
+        item = self._pages.get(key)
+        if item is None or item[1] < time.monotonic():
+            self.misses += 1
+            return None
+        self.hits += 1
+        return item[0]
+
+    def put(self, key: tuple, page: Dict, generation: int) -> None:
+        if generation != self.generation:
+            return
+        if len(self._pages) >= MAX_CACHED_PAGES:
+            self._pages.clear()
+        self._pages[key] = (page, time.monotonic() + self.ttl)
+
+    def clear(self) -> None:
+        self._pages.clear()
+        self.generation += 1
+
+    def stats(self) -> Dict:
+        return {"pages": len(self._pages), "ttl": self.ttl, "hits": self.hits, "misses": self.misses}
+
+
+leaderboard_cache = LeaderboardCache()
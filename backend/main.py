@@ -1,23 +1,60 @@
 from fastapi import FastAPI, Request, Form, Depends, HTTPException, WebSocket, WebSocketDisconnect
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, PlainTextResponse, RedirectResponse
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
 from sqlalchemy.orm import Session
 from models import User, Base, Game
-from database import engine, SessionLocal
-from passlib.context import CryptContext
+from database import engine, DbSession, get_session, session_scope, run_in_session, pool_stats
 from typing import Optional, Dict, Any, List
 from starlette.middleware.sessions import SessionMiddleware
 import secrets
 from pydantic import BaseModel
 from functools import wraps
 from utils import LobbyManager, GameManager
+import game_engine
+from game_engine import CELLS_COUNT, flush_loop, flush_all, mirror_remote
+from broadcast import ClientConnection, fan_out, queue_stats
+from pubsub import LOBBY_CHANNEL, create_backend, game_channel
+from rooms import room_registry, owner_url
+from identity import Identity, identity_cache
+from passwords import PasswordPoolBusy, password_hasher
+from leaderboard import leaderboard_cache, leaderboard_page
+from settlement import settlements
+import event_log
+import metrics
+import query_profile
+from matchmaking import matchmaking
+from wire import negotiate
+from throttle import PendingClick, TokenBucket, click_batches
+from config import ENGINE_FLUSH_INTERVAL, QUERY_PROFILE
+from contextlib import asynccontextmanager
+import asyncio
 import json
 import logging
 from datetime import datetime
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Запуск и остановка фоновой записи игровых движков в БД и транспорта рассылок"""
+    await broadcast_backend.start()
+    # Движки игр без соединений и кликов дольше ROOM_IDLE_TIMEOUT выгружаются после записи
+    flush_task = asyncio.create_task(flush_loop(ENGINE_FLUSH_INTERVAL, in_use=game_has_connections))
+    try:
+        yield
+    finally:
+        flush_task.cancel()
+        await flush_all()
+        await broadcast_backend.stop()
+        password_hasher.shutdown()
+        event_log.shutdown()
+
 # --- Конфигурация приложения ---
-app = FastAPI(title="Color Grid Game", description="Многопользовательская игра с закрашиванием клеток")
+app = FastAPI(
+    title="Color Grid Game",
+    description="Многопользовательская игра с закрашиванием клеток",
+    lifespan=lifespan
+)
 
 # Конфигурация сессии
 SESSION_DURATION = 3600 * 60  # 1 час
@@ -31,15 +68,25 @@ app.add_middleware(
     max_age=SESSION_DURATION
 )
 
+if metrics.ENABLED or QUERY_PROFILE:
+    @app.middleware("http")
+    async def query_profile_middleware(request: Request, call_next):
+        """Запросы к БД и их время за один HTTP-запрос"""
+        with query_profile.profile("http"):
+            return await call_next(request)
+
 # Подключение статических файлов
 app.mount("/static", StaticFiles(directory="../frontend"), name="static")
 templates = Jinja2Templates(directory="../frontend")
 
 # --- Настройки безопасности ---
-pwd_context = CryptContext(
-    schemes=["bcrypt"],
-    deprecated="auto"
-)
+# bcrypt выполняется в ограниченном пуле (passwords.py), не в цикле событий
+def password_pool_busy() -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail="Server is busy, try again later",
+        headers={"Retry-After": "1"}
+    )
 
 # --- Модели данных ---
 class UserSessionData(BaseModel):
@@ -51,28 +98,67 @@ class UserSessionData(BaseModel):
 Base.metadata.create_all(bind=engine)
 
 # --- Вспомогательные функции ---
-def get_db():
-    """Генератор сессий БД"""
-    db = SessionLocal()
+def _find_user(db: Session, username: str) -> Optional[User]:
+    return db.query(User).filter(User.username == username).first()
+
+def _create_user(db: Session, user: User) -> None:
     try:
-        yield db
-    finally:
-        db.close()
+        db.add(user)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+def _load_identity(db: Session, user_id: Optional[int], username: str) -> Optional[Identity]:
+    user = db.get(User, user_id) if user_id is not None else _find_user(db, username)
+    if not user or user.username != username:
+        return None
+    return Identity.from_user(user)
+
+def remember_user(request: Request, identity: Identity) -> None:
+    """Записывает пользователя в подписанную сессию и кэш"""
+    identity_cache.put(identity)
+    request.session["username"] = identity.username
+    request.session["user_data"] = identity.session_data()
 
-def get_current_user(request: Request, db: Session = Depends(get_db)) -> Optional[User]:
-    """Получает пользователя из БД по username из сессии"""
+def _update_password_hash(db: Session, user: User, password_hash: str) -> None:
+    try:
+        user.password_hash = password_hash
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+async def get_current_user(request: Request) -> Optional[Identity]:
+    """
+    Пользователь из сессии: снимок профиля берется из кэша по id,
+    в БД идем только при промахе
+    """
     username = request.session.get("username")
     if not username:
         return None
-    return db.query(User).filter(User.username == username).first()
+
+    user_id = (request.session.get("user_data") or {}).get("id")
+    if user_id is not None:
+        identity = identity_cache.get(user_id)
+        if identity is not None and identity.username == username:
+            return identity
+
+    async with session_scope() as db:
+        identity = await run_in_session(db, _load_identity, user_id, username)
+    if identity is None:
+        return None
+    remember_user(request, identity)
+    return identity
 
 def login_required(func):
-    """Декоратор для проверки аутентификации"""
+    """Декоратор для проверки аутентификации; пользователь доступен как request.state.user"""
     @wraps(func)
     async def wrapper(request: Request, *args, **kwargs):
-        user = get_current_user(request, next(get_db()))
+        user = await get_current_user(request)
         if not user:
             return RedirectResponse(url="/login", status_code=303)
+        request.state.user = user
         return await func(request, *args, **kwargs)
     return wrapper
 
@@ -92,29 +178,32 @@ async def register_user(
         request: Request,
         username: str = Form(..., min_length=3, max_length=50),
         password: str = Form(..., min_length=2),
-        db: Session = Depends(get_db)
+        db: DbSession = Depends(get_session)
 ):
     """Регистрация нового пользователя"""
-    if db.query(User).filter(User.username == username).first():
+    if await run_in_session(db, _find_user, username):
         raise HTTPException(
             status_code=400,
             detail="Username already taken"
         )
 
+    try:
+        password_hash = await password_hasher.hash(password)
+    except PasswordPoolBusy:
+        raise password_pool_busy()
+
     try:
         new_user = User(
             username=username,
-            password_hash=pwd_context.hash(password),
+            password_hash=password_hash,
             date_registration=datetime.utcnow()
         )
-        db.add(new_user)
-        db.commit()
+        await run_in_session(db, _create_user, new_user)
 
-        request.session["username"] = username
+        remember_user(request, Identity(new_user.id, new_user.username))
         return RedirectResponse(url="/profile", status_code=303)
 
     except Exception as e:
-        db.rollback()
         raise HTTPException(
             status_code=500,
             detail=f"Registration failed: {str(e)}"
@@ -130,34 +219,35 @@ async def login_user(
         request: Request,
         username: str = Form(...),
         password: str = Form(...),
-        db: Session = Depends(get_db)
+        db: DbSession = Depends(get_session)
 ):
     """Аутентификация пользователя"""
-    user = db.query(User).filter(User.username == username).first()
+    user = await run_in_session(db, _find_user, username)
+
+    try:
+        valid, new_hash = await password_hasher.verify(password, user.password_hash if user else None)
+    except PasswordPoolBusy:
+        raise password_pool_busy()
 
-    if not user or not pwd_context.verify(password, user.password_hash):
+    if not valid:
         raise HTTPException(
             status_code=401,
             detail="Invalid credentials"
         )
 
-    request.session.update({
-        "username": user.username,
-        "user_data": {
-            "id": user.id,
-            "username": user.username,
-        }
-    })
+    if new_hash:
+        # Параметры хеширования изменились — сохраняем хеш с новыми
+        await run_in_session(db, _update_password_hash, user, new_hash)
+
+    remember_user(request, Identity.from_user(user))
 
     return RedirectResponse(url="/profile", status_code=303)
 
 @app.get("/profile", response_class=HTMLResponse)
 @login_required
-async def profile(request: Request, db: Session = Depends(get_db)):
+async def profile(request: Request, db: DbSession = Depends(get_session)):
     """Страница профиля с игровой статистикой"""
-    current_user = get_current_user(request, db)
-    if not current_user:
-        return RedirectResponse(url="/login", status_code=303)
+    current_user = request.state.user
 
     lobby = LobbyManager(db)
     stats = await lobby.get_user_stats(current_user.username)
@@ -168,134 +258,200 @@ async def profile(request: Request, db: Session = Depends(get_db)):
         "stats": stats if stats["status"] == 200 else None
     })
 
+def lobby_state(username: str) -> Dict[str, Any]:
+    """Лобби игрока в очереди подбора этого воркера: свое, если игрок уже ждет, иначе текущее"""
+    lobby = matchmaking.lobby_of(username)
+    color = lobby.roster.color_of(username) if lobby else None
+    if lobby is None:
+        lobby = LobbyManager.current_lobby()
+    return {
+        "is_active": 1 if color else 0,
+        "count": lobby.fill,
+        "room_size": lobby.size,
+        "color": color,
+        "game_id": lobby.lobby_id,
+        "players": lobby.roster.entries(),
+        "available_colors": LobbyManager.available_colors(lobby)
+    }
+
 @app.get("/lobby", response_class=HTMLResponse)
 @login_required
-async def lobby_page(request: Request, db: Session = Depends(get_db)):
+async def lobby_page(request: Request):
     """Страница лобби с игровым интерфейсом"""
-    current_user = get_current_user(request, db)
-    if not current_user:
-        return RedirectResponse(url="/login", status_code=303)
-
-    lobby = LobbyManager(db)
-    game = await lobby.get_or_create_game()
-
-    # Проверяем, находится ли пользователь уже в игре
-    player_data = next(
-        (p.split(":") for p in game.game_players
-         if p.startswith(current_user.username + ":")),
-        None
-    )
+    current_user = request.state.user
+
+    # Очередь подбора одна на все воркеры — сокет лобби открывается на ее владельце
+    ws_base = owner_url(LOBBY_CHANNEL)
+    if ws_base is None:
+        state = lobby_state(current_user.username)
+    else:
+        # Очередь этого воркера пуста: настоящее состояние страница получит от владельца
+        # сообщением lobby_state по его сокету
+        state = {
+            "is_active": 0, "count": 0, "room_size": matchmaking.room_size, "color": None,
+            "game_id": 0, "players": [], "available_colors": LobbyManager.COLOR_PALETTE
+        }
 
     return templates.TemplateResponse("index.html", {
         "request": request,
         "username": current_user.username,
-        "is_active": 1 if player_data else 0,
-        "count":len(game.game_players),
-        "color": player_data[1] if player_data else None,
-        "game_id": game.id,
-        "available_colors": [c for c in LobbyManager.COLOR_PALETTE
-                            if not any(c in p for p in game.game_players)]
+        **state,
+        "ws_base": ws_base or ""
     })
 
+@app.get("/leaderboard")
+async def leaderboard(
+        limit: int = 20,
+        cursor: Optional[str] = None,
+        page: Optional[int] = None,
+        db: DbSession = Depends(get_session)
+):
+    """Рейтинг игроков: страница по курсору (next_cursor предыдущей) или по номеру"""
+    key = (limit, cursor, page)
+    result = leaderboard_cache.get(key)
+    if result is None:
+        generation = leaderboard_cache.generation
+        try:
+            result = await run_in_session(db, leaderboard_page, limit, cursor, page)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        leaderboard_cache.put(key, result, generation)
+    return {"status": 200, **result}
+
 @app.get("/logout", response_class=RedirectResponse)
 async def logout(request: Request):
     """Выход из системы"""
     request.session.clear()
     return RedirectResponse(url="/login", status_code=303)
 
-connected_clients: List[WebSocket] = []
+connected_clients: List[ClientConnection] = []
 
 @app.websocket("/ws")
-async def websocket_endpoint(
-        websocket: WebSocket,
-        db: Session = Depends(get_db)
-):
+async def websocket_endpoint(websocket: WebSocket):
     await websocket.accept()
-    connected_clients.append(websocket)
-
-    lobby = LobbyManager(db)
-    current_game = None
+    connection = ClientConnection(websocket).start()
+    connected_clients.append(connection)
 
     try:
         while True:
             data = await websocket.receive_json()
             action = data.get("action")
 
+            if action == "state":
+                # Состояние лобби из очереди владельца (страница могла прийти с другого воркера)
+                username = data.get("username")
+                if username:
+                    connection.send({"type": "lobby_state", **lobby_state(username)})
+                continue
+
             if action == "join":
                 username = data.get("username")
                 color = data.get("color")
 
                 if not username or not color:
-                    await websocket.send_json({"error": "Username and color required"})
+                    connection.send({"error": "Username and color required"})
                     continue
 
-                current_game = await lobby.get_or_create_game()
-                result = await lobby.add_player(current_game.id, username, color)
+                # Сессия БД живет только на время обработки сообщения
+                async with session_scope() as db:
+                    lobby = LobbyManager(db)
+                    game_id = lobby.current_lobby().lobby_id
+                    result = await lobby.add_player(game_id, username, color)
+                    start_check = None
+                    if result["status"] == 200:
+                        start_check = await lobby.start_game_check(game_id)
 
                 if result["status"] != 200:
-                    await websocket.send_json({"error": result.get("message")})
+                    connection.send({"error": result.get("message")})
                     continue
 
                 # Рассылаем всем клиентам обновление лобби
                 lobby_update = {
                     "type": "lobby_update",
-                    "game_id": current_game.id,
+                    "game_id": game_id,
                     **result
                 }
 
                 await broadcast_to_all(lobby_update)
 
                 # Проверка готовности к старту
-                start_check = await lobby.start_game_check(current_game.id)
                 if start_check["status"] == 200:
-                    game_manager = GameManager(db, current_game.id)
-
                     await broadcast_to_all({
                         "type": "game_start",
                         **start_check
                     })
+                elif start_check["status"] == 500:
+                    # Игра не сохранилась, лобби распущено — его игроки выбирают цвет заново
+                    await broadcast_to_all({
+                        "type": "lobby_reset",
+                        "game_id": game_id,
+                        **start_check
+                    })
 
     except WebSocketDisconnect:
         logging.info("WebSocket disconnected")
-        if websocket in connected_clients:
-            connected_clients.remove(websocket)
 
     except Exception as e:
         logging.error(f"WebSocket error: {e}")
-        await websocket.send_json({
+        connection.send({
             "error": str(e),
             "type": "error"
         })
+    finally:
+        if connection in connected_clients:
+            connected_clients.remove(connection)
+        await connection.close()
+
 async def broadcast_to_all(message: dict):
-    disconnected_clients = []
-    for client in connected_clients:
-        try:
-            await client.send_json(message)
-        except Exception as e:
-            logging.warning(f"Client disconnected or error sending: {e}")
-            disconnected_clients.append(client)
-    # Удаляем мёртвые сокеты
-    for dc in disconnected_clients:
-        connected_clients.remove(dc)
+    """Рассылка всем в лобби, во всех воркерах"""
+    await broadcast_backend.publish(LOBBY_CHANNEL, message)
+
+
+game_connections = {}  # {game_id: set(connection1, connection2...)}
+
+
+def game_has_connections(game_id: int) -> bool:
+    """Есть ли у игры сокеты на этом воркере (движок такой игры не выгружается)"""
+    return bool(game_connections.get(str(game_id)))
 
 
-game_connections = {}  # {game_id: set(websocket1, websocket2...)}
+def deliver_local(channel: str, message: dict) -> None:
+    """Доставляет сообщение канала сокетам этого процесса"""
+    if channel == LOBBY_CHANNEL:
+        # Удаляем мёртвые и не успевающие сокеты
+        for dc in fan_out(connected_clients, message):
+            if dc in connected_clients:
+                connected_clients.remove(dc)
+        return
+
+    if message.get("type") == "finish_game":
+        # Итоги записаны воркером, завершившим игру: итог приходит всем воркерам
+        # через брокер, и каждый сбрасывает свои страницы рейтинга
+        leaderboard_cache.clear()
+
+    game_id = channel.split(":", 1)[1]
+    if game_id not in game_connections:
+        return
+    for ws in fan_out(game_connections[game_id], message):
+        game_connections[game_id].discard(ws)
+
+
+# Клики других воркеров (CLAIM_MODE=db) попадают и в зеркало движка этого воркера
+broadcast_backend = create_backend(deliver_local, on_remote=mirror_remote)
 
 
 @app.get("/game/{game_id}", response_class=HTMLResponse)
 @login_required
-async def game_page(request: Request, game_id: str, db: Session = Depends(get_db)):
+async def game_page(request: Request, game_id: str, db: DbSession = Depends(get_session)):
     # Получаем текущего пользователя
-    current_user = get_current_user(request, db)
-    if not current_user:
-        return RedirectResponse(url="/login", status_code=303)
+    current_user = request.state.user
 
     try:
         # Создаем менеджер игры
-        game_manager = GameManager(db, int(game_id))
+        game_manager = await GameManager.open(db, int(game_id))
 
         # Получаем данные игры
-        init_result = game_manager.init_data()
+        init_result = await game_manager.init_data()
 
         # Проверяем успешность получения данных
         if "status" in init_result and init_result["status"] != 200:
@@ -308,7 +464,10 @@ async def game_page(request: Request, game_id: str, db: Session = Depends(get_db
             "game_id": game_id,
             "username": current_user.username,
             "players_data": init_result.get("players", []),
-            "game_state": init_result.get("game_state", {})
+            "game_state": init_result.get("game_state", {}),
+            "seq": init_result.get("seq", 0),
+            # Сокет игры открывается на воркере-владельце комнаты
+            "ws_base": owner_url(game_id) or ""
         })
 
     except ValueError:
@@ -318,72 +477,228 @@ async def game_page(request: Request, game_id: str, db: Session = Depends(get_db
 
 
 @app.websocket("/game/{game_id}/ws")
-async def game_websocket_endpoint( websocket: WebSocket, game_id: str,db: Session = Depends(get_db)):
-    await websocket.accept()
+async def game_websocket_endpoint(websocket: WebSocket, game_id: str):
+    # Клиент может предложить бинарный подпротокол для дельт кликов (wire.py)
+    subprotocol = negotiate(websocket)
+    await websocket.accept(subprotocol=subprotocol)
+
+    # Комнатой владеет другой воркер — отправляем клиента к нему
+    owner = owner_url(game_id)
+    if owner is not None:
+        await websocket.send_json({"type": "redirect", "url": f"{owner}/game/{game_id}/ws"})
+        await websocket.close(code=4003)
+        return
+
+    connection = ClientConnection(websocket, binary=subprotocol is not None).start()
 
     # Добавляем соединение в словарь игр
     if game_id not in game_connections:
         game_connections[game_id] = set()
-    game_connections[game_id].add(websocket)
+    game_connections[game_id].add(connection)
 
     try:
-        game_manager = GameManager(db, int(game_id))
+        async with session_scope() as db:
+            game_manager = await GameManager.open(db, int(game_id))
+
+            # Начальный снимок: от его seq клиент применяет дельты кликов
+            connection.send({
+                "type": "snapshot",
+                "data": await game_manager.snapshot()
+            })
 
+        bucket = TokenBucket()
         while True:
             data = await websocket.receive_json()
 
             if data.get("action") == "click":
+                if not bucket.take():
+                    click_batches.rate_limited += 1
+                    if bucket.limited == 1:
+                        # Одно предупреждение на серию отброшенных кликов, а не ответ на каждый
+                        connection.send({"type": "error", "message": "Слишком частые клики"})
+                    continue
+
                 username = data.get("username")
                 coord = data.get("coord")
-
                 if not username or not coord:
-                    await websocket.send_json({
+                    connection.send({
                         "type": "error",
                         "message": "Требуются username и coord"
                     })
                     continue
 
-                # Регистрируем клик
-                click_result = await game_manager.register_click(username, coord)
-
-                # Отправляем результат клика
-                await broadcast_to_game(game_id, {
-                    "type": "click_result",
-                    "data": click_result
-                })
-
-                # Проверяем завершение игры
-                finish_result = await game_manager.check_finish_game()
-                if finish_result:  # Если игра завершена
-                    await broadcast_to_game(game_id, {
-                        "type": "finish_game",
-                        "data": finish_result
-                    })
-                    break  # Завершаем соединение
+                # Клики, пришедшие пока актор комнаты занят, применяются одной пачкой
+                if await click_batches.submit(int(game_id), connection, username, coord, process_click_batch):
+                    break  # Игра завершена, закрываем соединение
+                continue
+
+            # Остальные сообщения комнаты выполняет ее актор, строго по очереди
+            if await room_registry.submit(int(game_id), lambda: process_game_message(connection, game_id, data)):
+                break  # Игра завершена, закрываем соединение
 
     except WebSocketDisconnect:
-        game_connections[game_id].discard(websocket)
+        pass
     except Exception as e:
-        await websocket.send_json({
+        connection.send({
             "type": "error",
             "message": str(e)
         })
     finally:
-        game_connections[game_id].discard(websocket)
+        conns = game_connections.get(game_id)
+        if conns is not None:
+            conns.discard(connection)
+            if not conns:
+                del game_connections[game_id]
+        await connection.close()
+
+async def process_game_message(connection: ClientConnection, game_id: str, data: dict) -> bool:
+    """Обработка сообщения в акторе комнаты с короткой сессией БД"""
+    # Снимок живого движка соединение из пула не берет
+    with query_profile.profile("ws"):
+        async with session_scope() as db:
+            return await handle_game_message(connection, game_id, GameManager(db, int(game_id)), data)
+
+async def handle_game_message(connection: ClientConnection, game_id: str,
+                              game_manager: GameManager, data: dict) -> bool:
+    """
+    Обрабатывает служебное сообщение игрового сокета (клики идут пачками, см. apply_click_batch)
+    Returns:
+        True, если игра завершена и соединение нужно закрыть
+    """
+    if data.get("action") == "resync":
+        # Клиент обнаружил пропуск в seq — отправляем полное состояние только ему
+        connection.send({
+            "type": "snapshot",
+            "data": await game_manager.snapshot()
+        })
+    return False
+
+async def process_click_batch(game_id: int, clicks: List[PendingClick]) -> bool:
+    """Пачка кликов в акторе комнаты: одна сессия БД и одна рассылка"""
+    with query_profile.profile("ws"):
+        async with session_scope() as db:
+            return await apply_click_batch(GameManager(db, game_id), clicks)
+
+async def apply_click_batch(game_manager: GameManager, clicks: List[PendingClick]) -> bool:
+    """
+    Применяет клики пачки в порядке поступления и рассылает их дельты одним сообщением
+    Returns:
+        True, если игра завершена и соединения нужно закрыть
+    """
+    results = await game_manager.register_clicks([(click.username, click.coord) for click in clicks])
+
+    deltas = []
+    for click, result in zip(clicks, results):
+        if result["status"] != 200:
+            # Отклоненный клик не меняет состояние — сообщаем только отправителю
+            click.connection.send({
+                "type": "error",
+                "message": result.get("error")
+            })
+        else:
+            deltas.append(result)
+    if not deltas:
+        return False
+
+    # Одна дельта уходит как прежде click_result, несколько — одним click_batch
+    game_id = str(game_manager.game_id)
+    if len(deltas) == 1:
+        await broadcast_to_game(game_id, {"type": "click_result", "data": deltas[0]})
+    else:
+        await broadcast_to_game(game_id, {"type": "click_batch", "data": deltas})
+
+    # Завершение проверяется только когда поле заполнено, а не на каждом клике
+    if deltas[-1]["game_stats"]["clicked_cells"] < CELLS_COUNT:
+        return False
+
+    finish_result = await game_manager.check_finish_game()
+    if finish_result is None:
+        return False
+    if finish_result["status"] == 200:
+        # Итог рассылает только завершивший игру вызов — ровно один раз
+        await broadcast_to_game(game_id, {
+            "type": "finish_game",
+            "data": finish_result
+        })
+    return finish_result["status"] != 500
 
 async def broadcast_to_game(game_id: str, message: dict):
-    if game_id not in game_connections:
-        return
-
-    disconnected = []
-    for ws in game_connections[game_id]:
-        try:
-            await ws.send_json(message)
-        except:
-            disconnected.append(ws)
-
-    for ws in disconnected:
-        game_connections[game_id].discard(ws)
+    """Рассылка участникам игры, во всех воркерах"""
+    await broadcast_backend.publish(game_channel(game_id), message)
+
+@app.get("/metrics/pool")
+async def db_pool_metrics():
+    """Состояние пула соединений с БД"""
+    return pool_stats()
+
+@app.get("/metrics/engines")
+async def engine_metrics():
+    """Движки игр в памяти: число, с незаписанными изменениями, выгруженные по простою"""
+    return game_engine.stats()
+
+@app.get("/metrics/rooms")
+async def room_metrics():
+    """Акторы комнат этого воркера"""
+    return room_registry.stats()
+
+@app.get("/metrics/lobby")
+async def lobby_metrics():
+    """Очередь подбора игроков"""
+    return matchmaking.stats()
+
+@app.get("/metrics/identity")
+async def identity_metrics():
+    """Кэш профилей авторизованных пользователей"""
+    return identity_cache.stats()
+
+@app.get("/metrics/passwords")
+async def password_metrics():
+    """Пул хеширования паролей"""
+    return password_hasher.stats()
+
+@app.get("/metrics/leaderboard")
+async def leaderboard_metrics():
+    """Кэш страниц рейтинга"""
+    return leaderboard_cache.stats()
+
+@app.get("/metrics/settlement")
+async def settlement_metrics():
+    """Завершения игр: выполненные и отсеянные повторные"""
+    return settlements.stats()
+
+@app.get("/metrics/logs")
+async def log_metrics():
+    """Очередь журнала событий: глубина, потерянные и отсеянные выборкой записи"""
+    return event_log.stats()
+
+@app.get("/metrics/queries")
+async def query_metrics():
+    """Профиль SQL по запросам: найденные повторы одной формы (N+1)"""
+    return query_profile.stats()
+
+@app.get("/metrics/clicks")
+async def click_metrics():
+    """Лимит частоты и пачки кликов: отброшенные клики, размер пачек"""
+    return click_batches.stats()
+
+@app.get("/metrics/queues")
+async def queue_metrics():
+    """Глубина исходящих очередей сокетов"""
+    return queue_stats()
+
+metrics.Gauge("lobby_connections", "Сокеты лобби этого воркера", lambda: len(connected_clients))
+metrics.Gauge("game_connections", "Сокеты игр этого воркера",
+              lambda: sum(len(conns) for conns in game_connections.values()))
+metrics.Gauge("game_engines", "Движки игр в памяти этого воркера", lambda: game_engine.stats()["engines"])
+metrics.Gauge("active_rooms", "Акторы игровых комнат этого воркера", lambda: room_registry.stats()["rooms"])
+metrics.Gauge("socket_queue_depth", "Сообщений в исходящих очередях сокетов", lambda: queue_stats()["queued"])
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Метрики в текстовом формате Prometheus (при METRICS_ENABLED=1)"""
+    if not metrics.ENABLED:
+        raise HTTPException(status_code=404, detail="Метрики выключены (METRICS_ENABLED=0)")
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,125 @@
+# matchmaking.py
+"""
+Очередь подбора игроков.
+
+Открытые лобби живут только в памяти процесса и разложены по корзинам
+заполненности, так что выбор лобби для нового игрока не зависит от числа
+сыгранных игр. В БД лобби попадает один раз — когда набирается и стартует.
+"""
+from typing import Dict, List, Optional, Tuple
+
+from config import ROOM_SIZE
+from roster import Roster
+
+
+class Lobby:
+    """Открытое лобби: игроки в порядке входа (порядок задает слоты на поле)"""
+
+    __slots__ = ("lobby_id", "size", "roster")
+
+    def __init__(self, lobby_id: int, size: int):
+        self.lobby_id = lobby_id
+        self.size = size
+        self.roster = Roster()
+
+    @property
+    def fill(self) -> int:
+        return len(self.roster)
+
+    @property
+    def is_full(self) -> bool:
+        return len(self.roster) >= self.size
+
+
+class MatchmakingQueue:
+    """Открытые лобби по заполненности; все операции O(размер комнаты)"""
+
+    def __init__(self, room_size: int = ROOM_SIZE):
+        self.room_size = room_size
+        self._next_id = 1
+        self._lobbies: Dict[int, Lobby] = {}
+        # _by_fill[n] — лобби с n игроками (dict как упорядоченное множество)
+        self._by_fill: List[Dict[int, Lobby]] = [{} for _ in range(room_size)]
+        self._lobby_of: Dict[str, int] = {}
+
+    def _create(self) -> Lobby:
+        lobby = Lobby(self._next_id, self.room_size)
+        self._next_id += 1
+        self._lobbies[lobby.lobby_id] = lobby
+        self._by_fill[0][lobby.lobby_id] = lobby
+        return lobby
+
+    def current(self) -> Lobby:
+        """Самое заполненное открытое лобби (новое, если открытых нет)"""
+        for bucket in reversed(self._by_fill):
+            if bucket:
+                return next(iter(bucket.values()))
+        return self._create()
+
+    def get(self, lobby_id: int) -> Optional[Lobby]:
+        return self._lobbies.get(lobby_id)
+
+    def lobby_of(self, username: str) -> Optional[Lobby]:
+        lobby_id = self._lobby_of.get(username)
+        return self._lobbies.get(lobby_id) if lobby_id is not None else None
+
+    def _move(self, lobby: Lobby, old_fill: int) -> None:
+        self._by_fill[old_fill].pop(lobby.lobby_id, None)
+        if not lobby.is_full:
+            self._by_fill[lobby.fill][lobby.lobby_id] = lobby
+
+    def join(self, lobby: Lobby, username: str, color: str) -> Optional[str]:
+        """
+        Добавляет игрока в лобби
+        Returns:
+            None при успехе, иначе текст ошибки
+        """
+        if username in self._lobby_of:
+            return "Игрок уже в лобби"
+        if lobby.roster.has_color(color):
+            return "Цвет уже занят"
+        if lobby.is_full:
+            return "Лобби заполнено"
+
+        old_fill = lobby.fill
+        lobby.roster.add(username, color)
+        self._lobby_of[username] = lobby.lobby_id
+        self._move(lobby, old_fill)
+        return None
+
+    def leave(self, username: str) -> Optional[Tuple[Lobby, str]]:
+        """Убирает игрока из его лобби. Returns: (лобби, освободившийся цвет) или None"""
+        lobby = self.lobby_of(username)
+        if lobby is None:
+            return None
+        old_fill = lobby.fill
+        color = lobby.roster.remove(username)
+        del self._lobby_of[username]
+        self._move(lobby, old_fill)
+        return lobby, color
+
+    def take(self, lobby_id: int) -> Optional[Lobby]:
+        """
+        Забирает набранное лобби из очереди перед сохранением игры.
+        Игроки сразу свободны: если игру сохранить не удалось, они входят в лобби заново
+        """
+        lobby = self._lobbies.get(lobby_id)
+        if lobby is None or not lobby.is_full:
+            return None
+        del self._lobbies[lobby_id]
+        for bucket in self._by_fill:
+            bucket.pop(lobby_id, None)
+        for username in lobby.roster.names:
+            self._lobby_of.pop(username, None)
+        return lobby
+
+    def stats(self) -> Dict:
+        return {
+            "open_lobbies": len(self._lobbies),
+            "waiting_players": len(self._lobby_of),
+            "by_fill": [len(bucket) for bucket in self._by_fill],
+            "room_size": self.room_size
+        }
+
+
+matchmaking = MatchmakingQueue()
@@ -0,0 +1,148 @@
+# metrics.py
+"""
+Метрики в текстовом формате Prometheus (GET /metrics).
+
+Включаются METRICS_ENABLED=1. Выключенные метрики почти ничего не стоят:
+декоратор timed возвращает функцию без обертки, а остальные точки замера
+проверяют ENABLED до вызова perf_counter. Время SQL собирает query_profile.
+"""
+import time
+from functools import wraps
+from typing import Callable, Dict, List, Sequence, Tuple
+
+from config import METRICS_ENABLED
+
+ENABLED = METRICS_ENABLED
+
+# Границы корзин по умолчанию (сек): от 0.5 мс до 5 с
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+BYTES_BUCKETS = (64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+_registry: List["Metric"] = []
+
+
+def _labels(names: Sequence[str], values: Tuple) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{value}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        _registry.append(self)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        super().__init__(name, help, labels)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1.0, *labels) -> None:
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def _samples(self) -> List[str]:
+        return [f"{self.name}{_labels(self.label_names, key)} {value}" for key, value in self._values.items()]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+        # labels -> [счетчики по корзинам..., +Inf], сумма
+        self._series: Dict[Tuple, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, *labels) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = ([0] * (len(self.buckets) + 1), [0.0])
+        counts, total = series
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[index] += 1
+                break
+        else:
+            counts[-1] += 1
+        total[0] += value
+
+    def _samples(self) -> List[str]:
+        lines = []
+        for key, (counts, total) in self._series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{self.name}_bucket{_labels(self.label_names + ('le',), key + (le,))} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {total[0]}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, key)} {cumulative}")
+        return lines
+
+
+class Gauge(Metric):
+    """Значение считается при выдаче /metrics: fn() -> число или {значения меток: число}"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, fn: Callable, labels: Sequence[str] = ()):
+        super().__init__(name, help, labels)
+        self.fn = fn
+
+    def _samples(self) -> List[str]:
+        value = self.fn()
+        if not isinstance(value, dict):
+            return [f"{self.name} {value}"]
+        return [f"{self.name}{_labels(self.label_names, key)} {v}" for key, v in value.items()]
+
+
+def render() -> str:
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# --- Метрики приложения ---
+ACTION_SECONDS = Histogram("game_action_seconds", "Время обработки игровых действий", ["action"])
+DB_QUERY_SECONDS = Histogram("db_query_seconds", "Время одного SQL-запроса")
+DB_REQUEST_SECONDS = Histogram("db_request_seconds", "Суммарное время SQL за запрос/сообщение", ["kind"])
+DB_REQUEST_QUERIES = Histogram("db_request_queries", "SQL-запросов за запрос/сообщение", ["kind"],
+                               buckets=COUNT_BUCKETS)
+BROADCAST_SECONDS = Histogram("broadcast_fanout_seconds", "Время постановки рассылки в очереди сокетов")
+BROADCAST_BYTES = Histogram("broadcast_message_bytes", "Размер сериализованного сообщения рассылки",
+                            buckets=BYTES_BUCKETS)
+BROADCAST_DELIVERIES = Counter("broadcast_deliveries_total", "Сообщений, поставленных в очереди сокетов")
+
+
+def timed(action: str):
+    """Декоратор корутины: время выполнения в ACTION_SECONDS{action}. Без метрик — без обертки"""
+    def decorator(fn):
+        if not ENABLED:
+            return fn
+
+        @wraps(fn)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                ACTION_SECONDS.observe(time.perf_counter() - started, action)
+        return wrapper
+    return decorator
+
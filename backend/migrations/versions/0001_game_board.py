@@ -0,0 +1,80 @@
+"""Компактное поле игры: games.board вместо clicked_cells и game_state["cells"]
+
+Revision ID: 0001_game_board
+Revises:
+Create Date: 2026-10-18 12:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0001_game_board"
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+CELLS_COUNT = 100
+
+games = sa.table(
+    "games",
+    sa.column("id", sa.Integer),
+    sa.column("game_players", postgresql.ARRAY(sa.String)),
+    sa.column("clicked_cells", postgresql.ARRAY(sa.Integer)),
+    sa.column("game_state", sa.JSON),
+    sa.column("board", sa.LargeBinary),
+    sa.column("claimed_cells", sa.Integer),
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("games", sa.Column("board", sa.LargeBinary(100), nullable=True))
+    op.add_column("games", sa.Column("claimed_cells", sa.Integer(), nullable=False, server_default="0"))
+
+    conn = op.get_bind()
+    rows = conn.execute(sa.select(games.c.id, games.c.game_players, games.c.clicked_cells, games.c.game_state))
+    for game_id, players, clicked, state in rows.fetchall():
+        slot_by_color = {p.split(":")[1]: slot for slot, p in enumerate(players or [], start=1)}
+        cells = (state or {}).get("cells", {})
+        board = bytearray(CELLS_COUNT)
+        for coord in clicked or []:
+            # 0xFF — клетка занята игроком, которого уже нет в составе
+            board[coord - 1] = slot_by_color.get(cells.get(str(coord)), 0xFF)
+        conn.execute(
+            games.update().where(games.c.id == game_id)
+            .values(board=bytes(board), claimed_cells=len(clicked or []))
+        )
+
+    op.execute("UPDATE games SET game_state = (game_state::jsonb - 'cells')::json WHERE game_state IS NOT NULL")
+    op.drop_column("games", "clicked_cells")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.add_column(
+        "games",
+        sa.Column("clicked_cells", postgresql.ARRAY(sa.Integer()), nullable=True),
+    )
+
+    conn = op.get_bind()
+    rows = conn.execute(sa.select(games.c.id, games.c.game_players, games.c.board, games.c.game_state))
+    for game_id, players, board, state in rows.fetchall():
+        colors = [p.split(":")[1] for p in players or []]
+        clicked, cells = [], {}
+        for index, slot in enumerate(board or b""):
+            if slot:
+                clicked.append(index + 1)
+                if slot <= len(colors):
+                    cells[str(index + 1)] = colors[slot - 1]
+        conn.execute(
+            games.update().where(games.c.id == game_id)
+            .values(clicked_cells=clicked, game_state={**(state or {}), "cells": cells})
+        )
+
+    op.drop_column("games", "claimed_cells")
+    op.drop_column("games", "board")
@@ -0,0 +1,84 @@
+"""Агрегаты игроков для профиля и рейтинга: таблица player_stats
+
+Revision ID: 0002_player_stats
+Revises: 0001_game_board
+Create Date: 2026-10-18 14:00:00
+
+"""
+from datetime import datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0002_player_stats"
+down_revision: Union[str, None] = "0001_game_board"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+users = sa.table(
+    "users",
+    sa.column("id", sa.Integer),
+    sa.column("username", sa.String),
+    sa.column("total_games", sa.Integer),
+    sa.column("wins_count", sa.Integer),
+    sa.column("total_clicks", sa.Integer),
+    sa.column("success_clicks", sa.Integer),
+    sa.column("color_used", postgresql.ARRAY(sa.String)),
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    player_stats = op.create_table(
+        "player_stats",
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), primary_key=True),
+        sa.Column("username", sa.String(50), nullable=False),
+        sa.Column("games_played", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("wins", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("total_clicks", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("success_clicks", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("success_ratio", sa.Float(), nullable=False, server_default="0"),
+        sa.Column("color_counts", postgresql.JSON(), nullable=True),
+        sa.Column("favourite_color", sa.String(8), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+    )
+    op.create_index(
+        "ix_player_stats_rank", "player_stats",
+        [sa.text("wins DESC"), sa.text("success_ratio DESC"), "user_id"]
+    )
+
+    # Начальные агрегаты из счетчиков users; число игр по цветам раньше не велось — по 1 на цвет
+    conn = op.get_bind()
+    rows = conn.execute(
+        sa.select(users.c.id, users.c.username, users.c.total_games, users.c.wins_count,
+                  users.c.total_clicks, users.c.success_clicks, users.c.color_used)
+        .where(users.c.total_games > 0)
+    )
+    now = datetime.utcnow()
+    stats = []
+    for user_id, username, games, wins, total, success, colors in rows.fetchall():
+        colors = colors or []
+        stats.append({
+            "user_id": user_id,
+            "username": username,
+            "games_played": games or 0,
+            "wins": wins or 0,
+            "total_clicks": total or 0,
+            "success_clicks": success or 0,
+            "success_ratio": (success or 0) / total if total else 0.0,
+            "color_counts": {color: 1 for color in colors},
+            "favourite_color": colors[0] if colors else None,
+            "updated_at": now,
+        })
+    if stats:
+        op.bulk_insert(player_stats, stats)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_player_stats_rank", table_name="player_stats")
+    op.drop_table("player_stats")
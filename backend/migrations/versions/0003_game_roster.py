@@ -0,0 +1,85 @@
+"""Состав игры в таблице game_players (слот и цвет) вместо строк "имя:цвет" в games.game_players
+
+Revision ID: 0003_game_roster
+Revises: 0002_player_stats
+Create Date: 2026-10-18 16:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0003_game_roster"
+down_revision: Union[str, None] = "0002_player_stats"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+games = sa.table(
+    "games",
+    sa.column("id", sa.Integer),
+    sa.column("game_players", postgresql.ARRAY(sa.String)),
+)
+users = sa.table(
+    "users",
+    sa.column("id", sa.Integer),
+    sa.column("username", sa.String),
+)
+game_players = sa.table(
+    "game_players",
+    sa.column("user_id", sa.Integer),
+    sa.column("game_id", sa.Integer),
+    sa.column("slot", sa.SmallInteger),
+    sa.column("color", sa.String),
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("game_players", sa.Column("slot", sa.SmallInteger(), nullable=True))
+    op.add_column("game_players", sa.Column("color", sa.String(8), nullable=True))
+
+    conn = op.get_bind()
+    user_ids = dict(conn.execute(sa.select(users.c.username, users.c.id)).fetchall())
+    # Таблица связи раньше не заполнялась — собираем ее заново из строк
+    conn.execute(game_players.delete())
+    rows = []
+    for game_id, players in conn.execute(sa.select(games.c.id, games.c.game_players)).fetchall():
+        for slot, entry in enumerate(players or [], start=1):
+            username, _, color = entry.partition(":")
+            # Слот сохраняется как был: на него ссылаются байты games.board
+            if username in user_ids:
+                rows.append({"user_id": user_ids[username], "game_id": game_id, "slot": slot, "color": color})
+    if rows:
+        op.bulk_insert(game_players, rows)
+
+    op.alter_column("game_players", "slot", nullable=False)
+    op.alter_column("game_players", "color", nullable=False)
+    op.create_unique_constraint("game_players_game_id_slot_key", "game_players", ["game_id", "slot"])
+    op.create_unique_constraint("game_players_game_id_color_key", "game_players", ["game_id", "color"])
+    op.drop_column("games", "game_players")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.add_column("games", sa.Column("game_players", postgresql.ARRAY(sa.String()), nullable=True))
+
+    conn = op.get_bind()
+    rows = conn.execute(
+        sa.select(game_players.c.game_id, users.c.username, game_players.c.color)
+        .select_from(game_players.join(users, users.c.id == game_players.c.user_id))
+        .order_by(game_players.c.game_id, game_players.c.slot)
+    ).fetchall()
+    by_game = {}
+    for game_id, username, color in rows:
+        by_game.setdefault(game_id, []).append(f"{username}:{color}")
+    for game_id, players in by_game.items():
+        conn.execute(games.update().where(games.c.id == game_id).values(game_players=players))
+
+    op.drop_constraint("game_players_game_id_color_key", "game_players", type_="unique")
+    op.drop_constraint("game_players_game_id_slot_key", "game_players", type_="unique")
+    op.drop_column("game_players", "color")
+    op.drop_column("game_players", "slot")
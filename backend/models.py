@@ -4,11 +4,15 @@ from sqlalchemy import (
     String,
     Boolean,
     DateTime,
+    Float,
     ForeignKey,
-    Table,
+    Index,
+    LargeBinary,
+    SmallInteger,
+    UniqueConstraint,
 )
 from sqlalchemy.ext.mutable import MutableList, MutableDict
-from sqlalchemy.orm import relationship, declarative_base
+from sqlalchemy.orm import backref, relationship, declarative_base
 from datetime import datetime
 from sqlalchemy.dialects.postgresql import ARRAY, JSON
 from sqlalchemy.ext.mutable import MutableDict
@@ -16,12 +20,20 @@ from sqlalchemy.dialects.postgresql import JSON
 
 Base = declarative_base()
 
-game_players = Table(
-    'game_players',
-    Base.metadata,
-    Column('user_id', ForeignKey('users.id'), primary_key=True),
-    Column('game_id', ForeignKey('games.id'), primary_key=True)
-)
+class GamePlayer(Base):
+    """Участник игры: слот (с 1, он же байт владельца клетки в Game.board) и цвет"""
+    __tablename__ = 'game_players'
+
+    user_id = Column(ForeignKey('users.id'), primary_key=True)
+    game_id = Column(ForeignKey('games.id'), primary_key=True)
+    slot = Column(SmallInteger, nullable=False)
+    color = Column(String(8), nullable=False)
+    user = relationship("User", lazy="joined")
+
+    __table_args__ = (
+        UniqueConstraint('game_id', 'slot'),
+        UniqueConstraint('game_id', 'color'),
+    )
 
 
 class User(Base):
@@ -37,7 +49,7 @@ class User(Base):
     date_registration = Column(DateTime, default=datetime.utcnow)
     color_used = Column(MutableList.as_mutable(ARRAY(String)), default=list)
     wins_count = Column(Integer, default=0)
-    games = relationship("Game", secondary=game_players, back_populates="players")
+    games = relationship("Game", secondary="game_players", back_populates="players", viewonly=True)
 
 
 class Game(Base):
@@ -46,9 +58,13 @@ class Game(Base):
     id = Column(Integer, primary_key=True)
     started_at = Column(DateTime, default=datetime.utcnow)
     is_active = Column(Boolean, default=False)
-    players = relationship("User", secondary=game_players, back_populates="games")
-    game_players = Column(MutableList.as_mutable(ARRAY(String)), default=list)
-    clicked_cells = Column(MutableList.as_mutable(ARRAY(Integer)), default=list)
+    players = relationship("User", secondary="game_players", back_populates="games", viewonly=True)
+    # Состав по слотам; грузится вместе с игрой вторым запросом (вместе с User)
+    roster = relationship("GamePlayer", order_by=GamePlayer.slot, lazy="selectin",
+                          cascade="all, delete-orphan")
+    # Поле 10x10: байт на клетку, 0 — свободна, иначе номер слота владельца в roster (с 1)
+    board = Column(LargeBinary(100))
+    claimed_cells = Column(Integer, default=0, nullable=False)
     total_clicks = Column(Integer, default=0)
     winners = Column(MutableList.as_mutable(ARRAY(String)), default=list)
     game_state = Column(MutableDict.as_mutable(JSON), default=dict)
@@ -65,4 +81,27 @@ class UserState(Base):
     success_clicks = Column(Integer, default=0)
     failed_clicks = Column(Integer, default=0)
     joined_at = Column(DateTime, default=datetime.utcnow)
-    color = Column(String(8))
\ No newline at end of file
+    color = Column(String(8))
+
+
+class PlayerStats(Base):
+    """Агрегаты игрока для профиля и рейтинга, обновляются при завершении игры"""
+    __tablename__ = 'player_stats'
+
+    user_id = Column(Integer, ForeignKey('users.id'), primary_key=True)
+    username = Column(String(50), nullable=False)
+    games_played = Column(Integer, default=0, nullable=False)
+    wins = Column(Integer, default=0, nullable=False)
+    total_clicks = Column(Integer, default=0, nullable=False)
+    success_clicks = Column(Integer, default=0, nullable=False)
+    success_ratio = Column(Float, default=0.0, nullable=False)
+    # {цвет: число игр этим цветом} и самый частый из них
+    color_counts = Column(MutableDict.as_mutable(JSON), default=dict)
+    favourite_color = Column(String(8))
+    updated_at = Column(DateTime, default=datetime.utcnow)
+    user = relationship("User", backref=backref("player_stats", uselist=False))
+
+    # Порядок рейтинга; по этому индексу идет постраничная выборка по курсору
+    __table_args__ = (
+        Index('ix_player_stats_rank', wins.desc(), success_ratio.desc(), user_id),
+    )
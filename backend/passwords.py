@@ -0,0 +1,78 @@
+# passwords.py
+"""
+Хеширование паролей вне цикла событий.
+
+bcrypt намеренно дорогой (сотни мс на хеш), поэтому hash/verify выполняются
+в ограниченном пуле потоков (bcrypt отпускает GIL). Число одновременных
+операций и длина очереди ограничены: сверх лимита сразу поднимается
+PasswordPoolBusy, и обработчик отвечает 503 вместо накопления очереди.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+
+from passlib.context import CryptContext
+
+from config import PASSWORD_BCRYPT_ROUNDS, PASSWORD_QUEUE_LIMIT, PASSWORD_WORKERS
+
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    # Хеши с другим числом раундов считаются устаревшими и перехешируются при входе
+    bcrypt__rounds=PASSWORD_BCRYPT_ROUNDS
+)
+
+
+class PasswordPoolBusy(Exception):
+    """Пул хеширования заполнен"""
+
+
+class PasswordHasher:
+    """Ограниченный пул потоков для bcrypt"""
+
+    def __init__(self, context: CryptContext = pwd_context,
+                 workers: int = PASSWORD_WORKERS, queue_limit: int = PASSWORD_QUEUE_LIMIT):
+        self.context = context
+        self.workers = workers
+        self.limit = workers + queue_limit
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self.in_flight = 0
+        self.rejected = 0
+
+    async def _submit(self, fn, *args):
+        # Проверка и счетчик без await между ними — атомарно для цикла событий
+        if self.in_flight >= self.limit:
+            self.rejected += 1
+            raise PasswordPoolBusy()
+        self.in_flight += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            self.in_flight -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._submit(self.context.hash, password)
+
+    async def verify(self, password: str, password_hash: Optional[str]) -> Tuple[bool, Optional[str]]:
+        """
+        Проверяет пароль
+        Returns:
+            (верен ли пароль, новый хеш — если старый нужно заменить, иначе None)
+        """
+        if not password_hash:
+            return False, None
+        return await self._submit(self.context.verify_and_update, password, password_hash)
+
+    def stats(self) -> Dict:
+        return {
+            "workers": self.workers,
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "rejected": self.rejected
+        }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False)
+
+
+password_hasher = PasswordHasher()
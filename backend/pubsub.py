@@ -0,0 +1,222 @@
+# pubsub.py
+"""
+Транспорт рассылок между процессами.
+
+broadcast_to_game / broadcast_to_all публикуют сообщение в канал бэкенда,
+а каждый процесс доставляет его своим сокетам. Бэкенды:
+    local    — один процесс, доставка сразу (по умолчанию)
+    postgres — LISTEN/NOTIFY в той же БД, через asyncpg
+    redis    — Redis PUBLISH/SUBSCRIBE (нужен пакет redis)
+HubBackend с общим LocalHub — замена брокера для проверки нескольких
+«воркеров» внутри одного процесса.
+
+on_remote вызывается только для сообщений других процессов, до их доставки:
+так воркер обновляет свое зеркало игры кликами, сделанными не через него.
+"""
+import asyncio
+import json
+import logging
+import uuid
+from typing import Callable, List, Optional
+
+from sqlalchemy.engine import make_url
+
+from config import BROADCAST_BACKEND, DATABASE_URL, REDIS_URL
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # redis нужен только для BROADCAST_BACKEND=redis
+    aioredis = None
+
+logger = logging.getLogger(__name__)
+
+# Функция доставки сообщения локальным сокетам: deliver(channel, message)
+Deliver = Callable[[str, dict], None]
+
+LOBBY_CHANNEL = "lobby"
+PUBSUB_CHANNEL = "color_grid_broadcast"
+# Ограничение размера payload у pg_notify
+PG_NOTIFY_LIMIT = 8000
+
+
+def game_channel(game_id) -> str:
+    return f"game:{game_id}"
+
+
+class BroadcastBackend:
+    """Базовый бэкенд: доставляет только в текущий процесс"""
+
+    def __init__(self, deliver: Deliver, on_remote: Optional[Deliver] = None):
+        self.deliver = deliver
+        self.on_remote = on_remote
+        # Свои сообщения доставляются сразу, эхо от брокера отбрасывается
+        self.origin = uuid.uuid4().hex
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+    async def publish(self, channel: str, message: dict) -> None:
+        self.deliver(channel, message)
+        try:
+            for payload in self._envelopes(channel, message):
+                await self._publish_remote(payload)
+        except Exception as e:
+            logger.error(f"Broadcast publish to {channel} failed: {e}")
+
+    async def _publish_remote(self, payload: str) -> None:
+        pass
+
+    def _envelopes(self, channel: str, message: dict) -> List[str]:
+        """Сообщения брокеру для одной публикации"""
+        return [self._envelope(channel, message)]
+
+    def _envelope(self, channel: str, message: dict) -> str:
+        return json.dumps(
+            {"origin": self.origin, "channel": channel, "message": message},
+            separators=(",", ":"), ensure_ascii=False
+        )
+
+    def _receive(self, payload: str) -> None:
+        """Сообщение от брокера: доставляем, если оно из другого процесса"""
+        try:
+            envelope = json.loads(payload)
+        except ValueError:
+            logger.warning("Invalid broadcast payload")
+            return
+        if envelope.get("origin") == self.origin:
+            return
+        if self.on_remote is not None:
+            try:
+                self.on_remote(envelope["channel"], envelope["message"])
+            except Exception as e:
+                logger.error(f"Remote broadcast handler failed: {e}")
+        self.deliver(envelope["channel"], envelope["message"])
+
+
+class LocalBackend(BroadcastBackend):
+    """Один процесс: публикация равна локальной доставке"""
+
+    async def publish(self, channel: str, message: dict) -> None:
+        self.deliver(channel, message)
+
+
+class LocalHub:
+    """Брокер в памяти: связывает несколько HubBackend как разные процессы"""
+
+    def __init__(self):
+        self.backends: List["HubBackend"] = []
+
+    def publish(self, payload: str) -> None:
+        for backend in self.backends:
+            backend._receive(payload)
+
+
+class HubBackend(BroadcastBackend):
+    def __init__(self, deliver: Deliver, hub: LocalHub, on_remote: Optional[Deliver] = None):
+        super().__init__(deliver, on_remote)
+        self.hub = hub
+
+    async def start(self) -> None:
+        self.hub.backends.append(self)
+
+    async def stop(self) -> None:
+        if self in self.hub.backends:
+            self.hub.backends.remove(self)
+
+    async def _publish_remote(self, payload: str) -> None:
+        self.hub.publish(payload)
+
+
+class PostgresBackend(BroadcastBackend):
+    """LISTEN/NOTIFY: отдельное соединение слушает канал, публикация через пул"""
+
+    def __init__(self, deliver: Deliver, dsn: str, on_remote: Optional[Deliver] = None):
+        super().__init__(deliver, on_remote)
+        self.dsn = dsn
+        self._listener = None
+        self._pool = None
+
+    async def start(self) -> None:
+        import asyncpg
+
+        self._listener = await asyncpg.connect(self.dsn)
+        await self._listener.add_listener(PUBSUB_CHANNEL, self._on_notify)
+        self._pool = await asyncpg.create_pool(self.dsn, min_size=1, max_size=4)
+
+    async def stop(self) -> None:
+        if self._listener is not None:
+            await self._listener.close()
+        if self._pool is not None:
+            await self._pool.close()
+
+    def _on_notify(self, connection, pid, channel, payload) -> None:
+        self._receive(payload)
+
+    def _envelopes(self, channel: str, message: dict) -> List[str]:
+        """
+        Пачка кликов больше PG_NOTIFY_LIMIT делится пополам, пока части не влезут
+        в NOTIFY: каждая часть — обычный click_batch, дельты идут в прежнем порядке
+        """
+        payload = self._envelope(channel, message)
+        data = message.get("data")
+        if (len(payload.encode()) <= PG_NOTIFY_LIMIT or message.get("type") != "click_batch"
+                or len(data) < 2):
+            return [payload]
+        half = len(data) // 2
+        return (self._envelopes(channel, {**message, "data": data[:half]})
+                + self._envelopes(channel, {**message, "data": data[half:]}))
+
+    async def _publish_remote(self, payload: str) -> None:
+        if len(payload.encode()) > PG_NOTIFY_LIMIT:
+            logger.error(f"Broadcast payload too large for NOTIFY: {len(payload)} bytes")
+            return
+        await self._pool.execute("SELECT pg_notify($1, $2)", PUBSUB_CHANNEL, payload)
+
+
+class RedisBackend(BroadcastBackend):
+    """Redis PUBLISH/SUBSCRIBE"""
+
+    def __init__(self, deliver: Deliver, url: str, on_remote: Optional[Deliver] = None):
+        if aioredis is None:
+            raise RuntimeError("BROADCAST_BACKEND=redis requires the 'redis' package")
+        super().__init__(deliver, on_remote)
+        self.url = url
+        self._client = None
+        self._reader: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        self._client = aioredis.from_url(self.url)
+        pubsub = self._client.pubsub()
+        await pubsub.subscribe(PUBSUB_CHANNEL)
+        self._reader = asyncio.create_task(self._read(pubsub))
+
+    async def stop(self) -> None:
+        if self._reader is not None:
+            self._reader.cancel()
+        if self._client is not None:
+            await self._client.aclose()
+
+    async def _read(self, pubsub) -> None:
+        async for item in pubsub.listen():
+            if item.get("type") == "message":
+                data = item["data"]
+                self._receive(data.decode() if isinstance(data, bytes) else data)
+
+    async def _publish_remote(self, payload: str) -> None:
+        await self._client.publish(PUBSUB_CHANNEL, payload)
+
+
+def create_backend(deliver: Deliver, name: str = BROADCAST_BACKEND,
+                   on_remote: Optional[Deliver] = None) -> BroadcastBackend:
+    """Создает бэкенд по имени из настроек"""
+    if name == "local":
+        return LocalBackend(deliver)
+    if name == "postgres":
+        dsn = make_url(DATABASE_URL).set(drivername="postgresql").render_as_string(hide_password=False)
+        return PostgresBackend(deliver, dsn, on_remote)
+    if name == "redis":
+        return RedisBackend(deliver, REDIS_URL, on_remote)
+    raise ValueError(f"Unknown BROADCAST_BACKEND: {name}")
@@ -0,0 +1,183 @@
+# query_profile.py
+"""
+Счетчик SQL-запросов на HTTP-запрос / сообщение сокета и детектор N+1.
+
+Слушатели курсора подключаются к движкам в database.py. Пока открыт
+profile(kind), каждый выполненный запрос учитывается в QueryProfile текущего
+контекста (contextvars переходят и в run_sync AsyncSession): число запросов,
+суммарное время и повторы одной формы запроса. Форма — текст SQL без
+значений (параметры уже вынесены драйвером, раскрытые IN (...) сворачиваются).
+
+При QUERY_PROFILE=1 запрос, в котором одна форма повторилась не меньше
+QUERY_REPEAT_THRESHOLD раз, пишется в журнал событий как n_plus_one и
+попадает в stats(). query_budget — ограничение для проверок горячих путей:
+при превышении бросает QueryBudgetExceeded.
+"""
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import event
+
+import metrics
+from config import QUERY_PROFILE, QUERY_REPEAT_THRESHOLD
+from event_log import get_logger, log_event
+
+logger = get_logger(__name__)
+
+# Сколько различных форм N+1 помнить для stats()
+MAX_FLAGGED_SHAPES = 100
+
+_IN_LIST = re.compile(r"\(\s*%\(\w+\)s(?:\s*,\s*%\(\w+\)s)+\s*\)|\(\s*\$\d+(?:\s*,\s*\$\d+)+\s*\)")
+_SPACES = re.compile(r"\s+")
+
+
+def statement_shape(statement: str) -> str:
+    """Текст запроса без различий в раскрытых списках IN и пробелах"""
+    return _SPACES.sub(" ", _IN_LIST.sub("(...)", statement)).strip()
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Обработчик выполнил больше запросов (или повторов формы), чем разрешено"""
+
+
+class QueryProfile:
+    """Запросы одного HTTP-запроса / сообщения сокета"""
+
+    __slots__ = ("kind", "count", "seconds", "shapes", "parent")
+
+    def __init__(self, kind: str, parent: Optional["QueryProfile"] = None):
+        self.kind = kind
+        self.count = 0
+        self.seconds = 0.0
+        self.shapes: Counter = Counter()
+        self.parent = parent
+
+    def record(self, statement: str, elapsed: float) -> None:
+        shape = statement_shape(statement)
+        profile = self
+        while profile is not None:  # вложенные профили (бюджет внутри запроса) видят те же запросы
+            profile.count += 1
+            profile.seconds += elapsed
+            profile.shapes[shape] += 1
+            profile = profile.parent
+
+    def repeated(self, threshold: int) -> List[Tuple[str, int]]:
+        """Формы, выполненные не меньше threshold раз"""
+        return [(shape, n) for shape, n in self.shapes.most_common() if n >= threshold]
+
+
+_current: ContextVar[Optional[QueryProfile]] = ContextVar("query_profile", default=None)
+
+_profiles = 0
+_flagged = 0
+_flagged_shapes: Dict[str, int] = {}
+
+
+@contextmanager
+def profile(kind: str) -> Iterator[Optional[QueryProfile]]:
+    """
+    Учитывает запросы блока (HTTP-запрос или сообщение сокета).
+    Без QUERY_PROFILE и METRICS_ENABLED ничего не делает.
+    """
+    if not (QUERY_PROFILE or metrics.ENABLED):
+        yield None
+        return
+    current = QueryProfile(kind, _current.get())
+    token = _current.set(current)
+    try:
+        yield current
+    finally:
+        _current.reset(token)
+        _finish(current)
+
+
+def _finish(current: QueryProfile) -> None:
+    global _profiles, _flagged
+    if metrics.ENABLED:
+        metrics.DB_REQUEST_SECONDS.observe(current.seconds, current.kind)
+        metrics.DB_REQUEST_QUERIES.observe(current.count, current.kind)
+    if not QUERY_PROFILE:
+        return
+    _profiles += 1
+    repeated = current.repeated(QUERY_REPEAT_THRESHOLD)
+    if not repeated:
+        return
+    _flagged += 1
+    for shape, _ in repeated:
+        if shape in _flagged_shapes or len(_flagged_shapes) < MAX_FLAGGED_SHAPES:
+            _flagged_shapes[shape] = _flagged_shapes.get(shape, 0) + 1
+    log_event(logger, "n_plus_one", "Повторяющиеся запросы", logging.WARNING,
+              kind=current.kind, queries=current.count, latency=current.seconds,
+              repeated=[{"statement": shape, "count": n} for shape, n in repeated])
+
+
+@contextmanager
+def query_budget(max_queries: Optional[int] = None, max_repeats: Optional[int] = None,
+                 label: str = "budget") -> Iterator[QueryProfile]:
+    """
+    Проверка горячего пути: блок выполняет не больше max_queries запросов и
+    ни одну форму запроса больше max_repeats раз.
+    Raises:
+        QueryBudgetExceeded
+    """
+    current = QueryProfile(label, _current.get())
+    token = _current.set(current)
+    try:
+        yield current
+    finally:
+        _current.reset(token)
+
+    if max_queries is not None and current.count > max_queries:
+        raise QueryBudgetExceeded(
+            f"{label}: {current.count} запросов при бюджете {max_queries}: {dict(current.shapes)}"
+        )
+    if max_repeats is not None:
+        repeated = current.repeated(max_repeats + 1)
+        if repeated:
+            raise QueryBudgetExceeded(f"{label}: запрос повторен {repeated[0][1]} раз: {repeated[0][0]}")
+
+
+def instrument_engine(sync_engine) -> None:
+    """Подключает учет запросов к движку SQLAlchemy (для async — к его sync_engine)"""
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if _current.get() is not None or metrics.ENABLED:
+            conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.get("query_started")
+        if not started:
+            return
+        elapsed = time.perf_counter() - started.pop()
+        if metrics.ENABLED:
+            metrics.DB_QUERY_SECONDS.observe(elapsed)
+        current = _current.get()
+        if current is not None:
+            current.record(statement, elapsed)
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _error(context):
+        # Запрос упал — after_cursor_execute не будет, убираем его отметку времени
+        conn = context.connection
+        if conn is not None and conn.info.get("query_started"):
+            conn.info["query_started"].pop()
+
+
+def stats() -> Dict:
+    return {
+        "enabled": QUERY_PROFILE,
+        "profiled": _profiles,
+        "flagged": _flagged,
+        "repeat_threshold": QUERY_REPEAT_THRESHOLD,
+        "shapes": [
+            {"statement": shape, "requests": n}
+            for shape, n in sorted(_flagged_shapes.items(), key=lambda item: -item[1])
+        ]
+    }
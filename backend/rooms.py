@@ -0,0 +1,130 @@
+# rooms.py
+"""
+Владельцы игровых комнат.
+
+Внутри процесса у каждой игры один актор — задача asyncio со своей очередью
+входящих команд, поэтому все сообщения комнаты обрабатываются строго по очереди
+одним владельцем. Между воркерами игра закрепляется за одним из них
+консистентным хешированием game_id (HashRing), клиенты подключаются к владельцу.
+"""
+import asyncio
+import bisect
+import hashlib
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+
+from config import ROOM_IDLE_TIMEOUT, WORKER_ID, WORKER_NODES
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class RoomActor:
+    """Очередь команд одной комнаты и задача, выполняющая их по порядку"""
+
+    def __init__(self, game_id: int, registry: "RoomRegistry"):
+        self.game_id = game_id
+        self.registry = registry
+        self.inbox: asyncio.Queue = asyncio.Queue()
+        self.processed = 0
+        self.task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                fn, future = await asyncio.wait_for(self.inbox.get(), ROOM_IDLE_TIMEOUT)
+            except asyncio.TimeoutError:
+                if self.inbox.empty():
+                    # Комната простаивает — освобождаем актор, при новом сообщении создастся заново
+                    self.registry._remove(self)
+                    return
+                continue
+
+            if future.done():  # отправитель уже отключился
+                continue
+            try:
+                result = await fn()
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                if not future.done():
+                    future.set_result(result)
+            self.processed += 1
+
+
+class RoomRegistry:
+    """Реестр акторов комнат процесса"""
+
+    def __init__(self):
+        self._rooms: Dict[int, RoomActor] = {}
+
+    def _remove(self, actor: RoomActor) -> None:
+        if self._rooms.get(actor.game_id) is actor:
+            del self._rooms[actor.game_id]
+
+    async def submit(self, game_id: int, fn: Callable[[], Awaitable[T]]) -> T:
+        """Выполняет fn в акторе комнаты, после всех ранее поставленных команд"""
+        actor = self._rooms.get(game_id)
+        if actor is None:
+            actor = self._rooms[game_id] = RoomActor(game_id, self)
+        future = asyncio.get_running_loop().create_future()
+        actor.inbox.put_nowait((fn, future))
+        return await future
+
+    def stats(self) -> Dict:
+        return {
+            "rooms": len(self._rooms),
+            "queued": sum(actor.inbox.qsize() for actor in self._rooms.values()),
+            "processed": sum(actor.processed for actor in self._rooms.values())
+        }
+
+
+class HashRing:
+    """Консистентное хеширование game_id на воркеры (с виртуальными узлами)"""
+
+    def __init__(self, nodes: List[str], replicas: int = 64):
+        self.nodes = list(nodes)
+        self._ring: List[Tuple[int, str]] = sorted(
+            (self._hash(f"{node}#{replica}"), node)
+            for node in self.nodes
+            for replica in range(replicas)
+        )
+        self._keys = [key for key, _ in self._ring]
+
+    @staticmethod
+    def _hash(value: str) -> int:
+        return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], "big")
+
+    def owner(self, game_id) -> Optional[str]:
+        if not self._ring:
+            return None
+        index = bisect.bisect(self._keys, self._hash(str(game_id))) % len(self._ring)
+        return self._ring[index][1]
+
+
+def parse_nodes(value: str) -> Dict[str, str]:
+    """WORKER_NODES: "w1=ws://host:8001,w2=ws://host:8002" -> {id: базовый ws-адрес}"""
+    nodes = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        node_id, _, url = item.partition("=")
+        nodes[node_id.strip()] = url.strip().rstrip("/")
+    return nodes
+
+
+room_registry = RoomRegistry()
+worker_nodes = parse_nodes(WORKER_NODES)
+hash_ring = HashRing(sorted(worker_nodes))
+
+
+def owner_url(game_id) -> Optional[str]:
+    """
+    Базовый ws-адрес воркера-владельца игры.
+    Returns:
+        None, если игра принадлежит этому воркеру (или воркер один)
+    """
+    owner = hash_ring.owner(game_id)
+    if owner is None or owner == WORKER_ID:
+        return None
+    return worker_nodes[owner]
@@ -0,0 +1,77 @@
+# roster.py
+"""
+Состав лобби и игры.
+
+Игроки хранятся по слотам в порядке входа (слот с 1 — он же байт владельца
+клетки в Game.board) с индексами имя -> слот и цвет -> слот, поэтому проверки
+участия и занятости цвета — O(1). В БД состав игры лежит в таблице
+game_players (GamePlayer), а не в строках "имя:цвет".
+"""
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+class Roster:
+    """Игроки по слотам с индексами по имени и цвету"""
+
+    __slots__ = ("names", "colors", "_by_name", "_by_color")
+
+    def __init__(self, entries: Iterable[Tuple[str, str]] = ()):
+        self.names: List[str] = []
+        self.colors: List[str] = []
+        self._by_name: Dict[str, int] = {}
+        self._by_color: Dict[str, int] = {}
+        for name, color in entries:
+            self.add(name, color)
+
+    @classmethod
+    def from_game(cls, game) -> "Roster":
+        """Состав сохраненной игры из строк GamePlayer (уже упорядочены по слоту)"""
+        return cls((player.user.username, player.color) for player in game.roster)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._by_name
+
+    def __iter__(self) -> Iterator[Tuple[str, str]]:
+        return zip(self.names, self.colors)
+
+    def add(self, name: str, color: str) -> int:
+        """Добавляет игрока в следующий слот. Returns: номер слота (с 1)"""
+        self.names.append(name)
+        self.colors.append(color)
+        slot = len(self.names)
+        self._by_name[name] = slot
+        self._by_color[color] = slot
+        return slot
+
+    def remove(self, name: str) -> Optional[str]:
+        """Убирает игрока, следующие сдвигаются на слот вперед. Returns: его цвет"""
+        slot = self._by_name.get(name)
+        if slot is None:
+            return None
+        color = self.colors[slot - 1]
+        del self.names[slot - 1]
+        del self.colors[slot - 1]
+        self._by_name = {n: i for i, n in enumerate(self.names, start=1)}
+        self._by_color = {c: i for i, c in enumerate(self.colors, start=1)}
+        return color
+
+    def slot_of(self, name: str) -> Optional[int]:
+        return self._by_name.get(name)
+
+    def color_of(self, name: str) -> Optional[str]:
+        slot = self._by_name.get(name)
+        return self.colors[slot - 1] if slot else None
+
+    def owner_of(self, color: str) -> Optional[str]:
+        slot = self._by_color.get(color)
+        return self.names[slot - 1] if slot else None
+
+    def has_color(self, color: str) -> bool:
+        return color in self._by_color
+
+    def entries(self) -> List[List[str]]:
+        """[[имя, цвет], ...] по слотам — формат players в сообщениях клиенту"""
+        return [[name, color] for name, color in self]
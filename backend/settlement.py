@@ -0,0 +1,55 @@
+# settlement.py
+"""
+Однократное завершение игры.
+
+Внутри процесса первый вызов settle для игры запускает подсчет итогов,
+а все параллельные вызовы ждут его и получают None, поэтому итог
+рассылается один раз. Между процессами то же гарантирует сравнение с
+обменом в БД: итоги пишет только транзакция, переключившая games.is_active
+с true на false (см. GameManager._finish_game).
+"""
+import asyncio
+from typing import Awaitable, Callable, Dict, Optional
+
+
+class SettlementCoordinator:
+    """Защелка завершения игр процесса"""
+
+    def __init__(self):
+        self._in_flight: Dict[int, asyncio.Future] = {}
+        self.settled = 0
+        self.duplicates = 0
+
+    async def settle(self, game_id: int, fn: Callable[[], Awaitable[Dict]]) -> Optional[Dict]:
+        """
+        Выполняет fn не более одного раза одновременно для игры
+        Returns:
+            результат fn для вызвавшего его, None — для остальных
+        """
+        pending = self._in_flight.get(game_id)
+        if pending is not None:
+            self.duplicates += 1
+            await asyncio.shield(pending)
+            return None
+
+        future = self._in_flight[game_id] = asyncio.get_running_loop().create_future()
+        try:
+            result = await fn()
+            if result.get("status") == 200:
+                self.settled += 1
+            return result
+        finally:
+            # После завершения движок выгружен и игра неактивна — повтор не начнется;
+            # при ошибке защелка снимается, и завершение повторится на следующем клике
+            del self._in_flight[game_id]
+            future.set_result(None)
+
+    def stats(self) -> Dict:
+        return {
+            "in_flight": len(self._in_flight),
+            "settled": self.settled,
+            "duplicates": self.duplicates
+        }
+
+
+settlements = SettlementCoordinator()
@@ -0,0 +1,141 @@
+# throttle.py
+"""
+Ограничение частоты и склейка кликов игровых сокетов.
+
+TokenBucket — лимит кликов одного соединения: CLICK_RATE в секунду с запасом
+CLICK_BURST; лишние клики отбрасываются до актора комнаты и БД.
+
+ClickCoalescer — клики комнаты, пришедшие, пока ее актор занят, копятся в
+пачку; актор применяет пачку целиком (одна сессия, одна блокировка движка,
+одна рассылка), а не по команде и рассылке на каждый клик.
+
+При ROOM_TICK_HZ > 0 комната работает тактами: пачка ждет ближайшей границы
+такта (сетка 1/ROOM_TICK_HZ по часам цикла событий), поэтому все клики такта
+применяются в порядке поступления и уходят одним сообщением. Задержка клика
+растет в среднем на полтакта, зато рассылок и кодирований — не больше
+ROOM_TICK_HZ в секунду на комнату при любом потоке кликов.
+"""
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, List, Set
+
+from config import CLICK_BURST, CLICK_RATE, ROOM_TICK_HZ
+from rooms import RoomRegistry, room_registry
+
+
+class TokenBucket:
+    """Маркерное ведро: rate маркеров в секунду, не больше burst про запас"""
+
+    __slots__ = ("rate", "burst", "tokens", "updated", "limited")
+
+    def __init__(self, rate: float = CLICK_RATE, burst: int = CLICK_BURST):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        # Отброшено подряд с последнего пропущенного клика
+        self.limited = 0
+
+    def take(self) -> bool:
+        """Забирает маркер. Returns: False, если лимит исчерпан (rate <= 0 — без лимита)"""
+        if self.rate <= 0:
+            return True
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < 1:
+            self.limited += 1
+            return False
+        self.tokens -= 1
+        self.limited = 0
+        return True
+
+
+class PendingClick:
+    """Клик, ожидающий применения своей пачкой"""
+
+    __slots__ = ("connection", "username", "coord", "future")
+
+    def __init__(self, connection, username: str, coord: int, future: asyncio.Future):
+        self.connection = connection
+        self.username = username
+        self.coord = coord
+        self.future = future
+
+
+# apply(game_id, clicks) -> True, если игра завершена
+ApplyBatch = Callable[[int, List[PendingClick]], Awaitable[bool]]
+
+
+class ClickCoalescer:
+    """Пачки кликов по комнатам поверх акторов RoomRegistry"""
+
+    def __init__(self, registry: RoomRegistry = room_registry, tick_hz: float = ROOM_TICK_HZ):
+        self.registry = registry
+        self.tick_hz = tick_hz
+        self.interval = 1 / tick_hz if tick_hz > 0 else 0.0
+        self._pending: Dict[int, List[PendingClick]] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self.rate_limited = 0
+        self.batches = 0
+        self.clicks = 0
+        self.max_batch = 0
+
+    async def submit(self, game_id: int, connection, username: str, coord: int, apply: ApplyBatch) -> bool:
+        """
+        Ставит клик в текущую пачку комнаты; первый клик пачки ставит ее в очередь актора
+        Returns:
+            True, если игра завершена
+        """
+        future = asyncio.get_running_loop().create_future()
+        batch = self._pending.get(game_id)
+        if batch is None:
+            batch = self._pending[game_id] = []
+            # Отдельная задача: отключение первого клиента не должно отменить пачку остальных
+            task = asyncio.create_task(self._schedule(game_id, apply))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        batch.append(PendingClick(connection, username, coord, future))
+        return await future
+
+    async def _schedule(self, game_id: int, apply: ApplyBatch) -> None:
+        if self.interval:
+            # До границы такта пачка копит клики комнаты
+            now = asyncio.get_running_loop().time()
+            await asyncio.sleep(self.interval - now % self.interval)
+        await self.registry.submit(game_id, lambda: self._run(game_id, apply))
+
+    async def _run(self, game_id: int, apply: ApplyBatch) -> None:
+        # Пачка закрывается, когда актор до нее дошел: следующие клики — в новую
+        clicks = self._pending.pop(game_id, [])
+        if not clicks:
+            return
+        self.batches += 1
+        self.clicks += len(clicks)
+        self.max_batch = max(self.max_batch, len(clicks))
+        try:
+            finished = await apply(game_id, clicks)
+        except Exception as e:
+            for click in clicks:
+                if not click.future.done():
+                    click.future.set_exception(e)
+            return
+        for click in clicks:
+            if not click.future.done():
+                click.future.set_result(finished)
+
+    def stats(self) -> Dict:
+        return {
+            "rate": CLICK_RATE,
+            "burst": CLICK_BURST,
+            "tick_hz": self.tick_hz,
+            "rate_limited": self.rate_limited,
+            "batches": self.batches,
+            "clicks": self.clicks,
+            "avg_batch": round(self.clicks / self.batches, 2) if self.batches else 0,
+            "max_batch": self.max_batch,
+            "pending": sum(len(batch) for batch in self._pending.values())
+        }
+
+
+click_batches = ClickCoalescer()
@@ -1,26 +1,46 @@
 # utils/game_objects.py
-from typing import Dict, List, Optional, Any, Tuple
+from typing import Dict, List, Optional, Any, Tuple, Callable, TypeVar, Union
 from sqlalchemy.orm import Session
-from models import Game, User, UserState
+from sqlalchemy import String, and_, case, cast, func, insert, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import Game, GamePlayer, User, UserState
+from game_engine import (
+    GameEngine, CELLS_COUNT, board_cells, empty_board, load_engine, load_roster, get_engine, drop_engine,
+    engine_load_lock, claim_cell_in_db, read_board
+)
+from matchmaking import Lobby, matchmaking
+from roster import Roster
+from identity import identity_cache
+from leaderboard import GameResult, get_player_stats, leaderboard_cache, record_results
+from settlement import settlements
+from event_log import get_logger, log_event
+from metrics import timed
 from datetime import datetime
 import logging
-from logging.handlers import RotatingFileHandler
-from collections import Counter
-
-# Настройка логирования
-logger = logging.getLogger(__name__)
-handler = RotatingFileHandler("game_process.log", maxBytes=1_000_000, backupCount=5)
-formatter = logging.Formatter('[%(asctime)s] %(levelname)s — %(message)s')
-handler.setFormatter(formatter)
-logger.setLevel(logging.INFO)
-logger.addHandler(handler)
-logger.propagate = False
+import time
+
+# Журнал событий: запись в файл идет фоновым потоком, не в цикле событий
+logger = get_logger(__name__)
+
+T = TypeVar("T")
+
 
 class BaseGameManager:
     """Базовый класс для управления игрой с общими методами"""
 
-    def __init__(self, db: Session):
-        self.db = db
+    def __init__(self, db: Union[Session, AsyncSession]):
+        self.session = db
+        # Синхронный интерфейс сессии; для AsyncSession он доступен только внутри _run
+        self.db = db.sync_session if isinstance(db, AsyncSession) else db
+
+    async def _run(self, fn: Callable[..., T], *args) -> T:
+        """
+        Выполняет синхронный код работы с БД.
+        С AsyncSession код идет через run_sync поверх asyncpg и не блокирует цикл событий.
+        """
+        if isinstance(self.session, AsyncSession):
+            return await self.session.run_sync(lambda _: fn(*args))
+        return fn(*args)
 
     async def get_user_stats(self, username: str) -> Dict[str, Any]:
         """
@@ -39,14 +59,16 @@ class BaseGameManager:
                 "colors_used": List[str]
             }
         """
+        return await self._run(self._get_user_stats, username)
+
+    def _get_user_stats(self, username: str) -> Dict[str, Any]:
         try:
             user = self.db.query(User).filter(User.username == username).first()
             if not user:
                 return {"status": 404, "error": "User not found"}
 
-            # Calculate color statistics safely
-            color_stats = Counter(user.color_used)
-            most_common_color = color_stats.most_common(1)[0][0] if user.color_used else None
+            # Агрегаты ведутся при завершении игр; до первой игры строки нет
+            stats = get_player_stats(self.db, user.id)
 
             # Calculate failed clicks
             failed_clicks = max(0, user.total_clicks - user.success_clicks)
@@ -54,21 +76,21 @@ class BaseGameManager:
             return {
                 "status": 200,
                 "username": user.username,
-                "total_games": user.total_games,
+                "total_games": stats.games_played if stats else user.total_games,
                 "total_clicks": user.total_clicks,
                 "success_clicks": user.success_clicks,
                 "failed_clicks": failed_clicks,  # Fixed typo in key name
-                "wins_count": user.wins_count,
-                "most_used_color": most_common_color,
+                "wins_count": stats.wins if stats else user.wins_count,
+                "most_used_color": stats.favourite_color if stats else None,
                 "registration_date": user.date_registration.isoformat(),
                 "colors_used": user.color_used
             }
         except Exception as e:
-            logger.error(f"Error getting stats for {username}: {e}")
+            log_event(logger, "user_stats", f"Error getting stats: {e}", logging.ERROR, username=username)
             return {"status": 500, "error": "Internal server error"}
 
 class LobbyManager(BaseGameManager):
-    """Управление лобби: создание игры, добавление игроков, старт игры"""
+    """Управление лобби: подбор игроков через очередь, старт игры"""
 
     COLOR_PALETTE = [
         "#FF0000", "#00FF00", "#0000FF", "#FFFF00",  # Красный, Зеленый, Синий, Желтый
@@ -77,44 +99,21 @@ class LobbyManager(BaseGameManager):
         "#C0C0C0", "#808080", "#FFA500", "#A52A2A"  # Серебряный, Серый, Оранжевый, Коричневый
     ]
 
-    def __init__(self, db: Session):
+    def __init__(self, db: Union[Session, AsyncSession]):
         super().__init__(db)
 
-    async def get_or_create_game(self) -> Tuple[Game, bool]:
-        """
-        Находит ожидающую игру или создает новую
-        Returns:
-            (Game, created) - игра и флаг создания новой
-        """
-        try:
-            game = self.db.query(Game).filter(Game.is_active == False).first()
-            if game:
-                return game
-
-            new_game = Game(
-                is_active=False,
-                started_at=datetime.utcnow(),
-                game_players=[],
-                clicked_cells=[],
-                total_clicks=0,
-                winners=[],
-                game_state={
-                    "state": "waiting",
-                    "players": [],
-                    "available_colors": self.COLOR_PALETTE.copy()
-                }
-            )
-            self.db.add(new_game)
-            self.db.commit()
-            self.db.refresh(new_game)
-            return new_game
+    @staticmethod
+    def current_lobby() -> Lobby:
+        """Лобби, в которое попадет следующий игрок (из очереди подбора, без БД)"""
+        return matchmaking.current()
 
-        except Exception as e:
-            logger.error(f"Error creating game: {e}")
-            self.db.rollback()
-            raise
+    @classmethod
+    def available_colors(cls, lobby: Lobby) -> List[str]:
+        """Свободные цвета лобби (без БД)"""
+        return [c for c in cls.COLOR_PALETTE if not lobby.roster.has_color(c)]
 
-    async def add_player(self, game_id: int, username: str, color: str) -> Dict:
+    @timed("add_player")
+    async def add_player(self, lobby_id: int, username: str, color: str) -> Dict:
         """
         Добавляет игрока с выбранным цветом в лобби
         Returns:
@@ -126,114 +125,69 @@ class LobbyManager(BaseGameManager):
                 "available_colors": List[str]
             }
         """
-        try:
-            if color not in self.COLOR_PALETTE:
-                return {"status": 400, "message": "Неверный цвет"}
-
-            game = self.db.query(Game).get(game_id)
-            if not game:
-                return {"status": 404, "message": "Игра не найдена"}
+        started = time.perf_counter()
+        if color not in self.COLOR_PALETTE:
+            return {"status": 400, "message": "Неверный цвет"}
 
-            user = self.db.query(User).filter(User.username == username).first()
-            if not user:
-                return {"status": 404, "message": "Пользователь не найден"}
-
-            for player in game.game_players:
-                name, clr = player.split(":")
-                if clr == color:
-                    return {"status": 400, "message": "Цвет уже занят"}
-                if name == username:
-                    return {"status": 400, "message": "Игрок уже в лобби"}
-
-            game.game_players.append(f"{username}:{color}")
-            game.game_state["players"].append({
-                "username": username,
-                "color": color,
-                "ready": False
-            })
-            user.color = color
-            game.game_state["available_colors"].remove(color)
-            print(user.username)
-            players = game.game_players or []
-            print(type(players))
-            if f"{user.username}:{color}" not in players:
-                players.append(f"{user.username}:{color}")
-                game.game_players = players  # <--- вот это нужно обязательно
-
-            self.db.commit()
-            print(game.game_players)
-            return {
-                "status": 200,
-                "game_id": game.id,
-                "players_count": len(game.game_players),
-                "players": [p.split(":") for p in game.game_players],
-                "available_colors": game.game_state["available_colors"]
-            }
+        lobby = matchmaking.get(lobby_id)
+        if lobby is None:
+            return {"status": 404, "message": "Игра не найдена"}
 
+        try:
+            user_exists = await self._run(self._user_exists, username)
         except Exception as e:
-            logger.error(f"Error adding player {username}: {e}")
-            self.db.rollback()
+            log_event(logger, "join", f"Error adding player: {e}", logging.ERROR,
+                      lobby_id=lobby_id, username=username)
             return {"status": 500, "message": "Ошибка сервера"}
+        if not user_exists:
+            return {"status": 404, "message": "Пользователь не найден"}
+
+        # Проверка и вход выполняются без await между ними — атомарно для цикла событий
+        error = matchmaking.join(lobby, username, color)
+        if error:
+            return {"status": 400, "message": error}
+
+        log_event(logger, "join", lobby_id=lobby_id, username=username, color=color,
+                  players=lobby.fill, latency=time.perf_counter() - started)
+        return {
+            "status": 200,
+            "game_id": lobby.lobby_id,
+            "players_count": lobby.fill,
+            "players": lobby.roster.entries(),
+            "available_colors": self.available_colors(lobby)
+        }
+
+    def _user_exists(self, username: str) -> bool:
+        return self.db.query(User.id).filter(User.username == username).first() is not None
 
-    async def remove_player(self, game_id: int, username: str) -> Dict:
+    async def remove_player(self, lobby_id: int, username: str) -> Dict:
         """
         Удаляет игрока из лобби
         Returns:
             {
-                "status": 200/404/500,
+                "status": 200/404,
                 "message": str,
                 "removed_color": str,
                 "available_colors": List[str]
             }
         """
-        try:
-            game = self.db.query(Game).get(game_id)
-            if not game:
-                return {"status": 404, "message": "Игра не найдена"}
-
-            user = self.db.query(User).filter(User.username == username).first()
-            if not user:
-                return {"status": 404, "message": "Пользователь не найден"}
-
-            removed_color = None
-            new_players = []
-            for p in game.game_players:
-                name, clr = p.split(":")
-                if name != username:
-                    new_players.append(p)
-                else:
-                    removed_color = clr
-
-            if removed_color is None:
-                return {"status": 404, "message": "Игрок не найден в лобби"}
-
-            game.game_players = new_players
-            game.game_state["players"] = [
-                p for p in game.game_state["players"]
-                if p["username"] != username
-            ]
-            game.game_state["available_colors"].append(removed_color)
-
-            if user in game.players:
-                game.players.remove(user)
-
-            self.db.commit()
+        lobby = matchmaking.lobby_of(username)
+        if lobby is None or lobby.lobby_id != lobby_id:
+            return {"status": 404, "message": "Игрок не найден в лобби"}
 
-            return {
-                "status": 200,
-                "message": "Игрок удален",
-                "removed_color": removed_color,
-                "available_colors": game.game_state["available_colors"]
-            }
-
-        except Exception as e:
-            logger.error(f"Error removing player {username}: {e}")
-            self.db.rollback()
-            return {"status": 500, "message": "Ошибка сервера"}
+        _, removed_color = matchmaking.leave(username)
+        return {
+            "status": 200,
+            "message": "Игрок удален",
+            "removed_color": removed_color,
+            "available_colors": self.available_colors(lobby)
+        }
 
-    async def start_game_check(self, game_id: int) -> Dict:
+    @timed("start_game_check")
+    async def start_game_check(self, lobby_id: int) -> Dict:
         """
-        Проверяет готовность игры к старту (4 уникальных игрока)
+        Стартует игру, если лобби набрано (ROOM_SIZE игроков с разными цветами).
+        Игра сохраняется в БД только здесь.
         Returns:
             {
                 "status": 200/400/404/500,
@@ -241,203 +195,424 @@ class LobbyManager(BaseGameManager):
                 "start_time": str,
                 "players": List[Tuple[name, color]]
             }
+            при 500 лобби распущено, players — его игроки (им нужно войти заново)
         """
+        lobby = matchmaking.get(lobby_id)
+        if lobby is None:
+            return {"status": 404, "message": "Игра не найдена"}
+
+        if len(lobby.roster) != matchmaking.room_size:
+            return {"status": 400, "message": "Недостаточно игроков или цвета повторяются"}
+
+        # Забираем лобби из очереди до await: второй старт того же лобби невозможен
+        lobby = matchmaking.take(lobby_id)
+        started = time.perf_counter()
         try:
-            game = self.db.query(Game).get(game_id)
-            if not game:
-                return {"status": 404, "message": "Игра не найдена"}
-
-            # Проверка условий старта
-            if len(game.game_players) != 2 or len({p.split(":")[1] for p in game.game_players}) != 2:
-                return {"status": 400, "message": "Недостаточно игроков или цвета повторяются"}
-
-            # Активация игры
-            game.is_active = True
-            game.started_at = datetime.utcnow()
-            game.game_state.update({
-                "state": "active",
-                "start_time": datetime.utcnow().isoformat(),
-                "grid_size": 10,
-                "cells": {}
-            })
+            game_id, started_at = await self._run(self._start_game, lobby)
+        except Exception as e:
+            log_event(logger, "game_start", f"Error starting game: {e}", logging.ERROR, lobby_id=lobby_id)
+            # Набранное лобби больше никто не стартует: не возвращаем его в очередь,
+            # а отпускаем игроков, иначе они застрянут с «Игрок уже в лобби»
+            return {"status": 500, "message": "Не удалось начать игру, выберите цвет заново",
+                    "players": lobby.roster.entries()}
 
-            self.db.commit()
+        log_event(logger, "game_start", game_id=game_id, lobby_id=lobby_id,
+                  players=lobby.roster.names, latency=time.perf_counter() - started)
 
-            return {
-                "status": 200,
-                "game_id": game.id,
-                "start_time": game.started_at.isoformat(),
-                "players": [p.split(":") for p in game.game_players]
-            }
+        return {
+            "status": 200,
+            "game_id": game_id,
+            "start_time": started_at.isoformat(),
+            "players": lobby.roster.entries()
+        }
 
-        except Exception as e:
-            logger.error(f"Error starting game {game_id}: {e}")
+    def _start_game(self, lobby: Lobby) -> Tuple[int, datetime]:
+        try:
+            started_at = datetime.utcnow()
+            roster = lobby.roster
+            game = Game(
+                is_active=True,
+                started_at=started_at,
+                board=empty_board(),
+                claimed_cells=0,
+                total_clicks=0,
+                winners=[],
+                game_state={
+                    "state": "active",
+                    "players": [
+                        {"username": name, "color": color, "ready": True}
+                        for name, color in roster
+                    ],
+                    "available_colors": self.available_colors(lobby),
+                    "start_time": started_at.isoformat(),
+                    "grid_size": 10
+                }
+            )
+            self.db.add(game)
+
+            users = self.db.query(User).filter(User.username.in_(roster.names)).all()
+            for user in users:
+                user.color = roster.color_of(user.username)
+                # Слот из лобби: порядок входа задает номер владельца клетки в board
+                game.roster.append(GamePlayer(user=user, slot=roster.slot_of(user.username), color=user.color))
+
+            self.db.flush()
+            game_id = game.id
+            # Состояния всех игроков создаются сразу, одним INSERT, а не на первом клике
+            if users:
+                self.db.execute(insert(UserState), [
+                    {"game_id": game_id, "user_id": user.id, "color": roster.color_of(user.username),
+                     "total_clicks": 0, "success_clicks": 0, "failed_clicks": 0, "joined_at": started_at}
+                    for user in users
+                ])
+            user_ids = [user.id for user in users]
+            self.db.commit()
+            # Цвет входит в снимок профиля — сбрасываем закэшированные записи
+            for user_id in user_ids:
+                identity_cache.invalidate(user_id)
+            return game_id, started_at
+
+        except Exception:
             self.db.rollback()
-            return {"status": 500, "message": "Ошибка сервера"}
+            raise
 
 
 class GameManager(BaseGameManager):
     """Управление игровым процессом с учетом UserState"""
 
-    def __init__(self, db: Session, game_id: int):
+    def __init__(self, db: Union[Session, AsyncSession], game_id: int):
         super().__init__(db)
         self.game_id = game_id
-        self.game = self.db.query(Game).get(self.game_id)
-        if not self.game:
+        self._game: Optional[Game] = None
+
+    @property
+    def game(self) -> Game:
+        """Строка игры; загружается при первом обращении, чтобы клики по живому движку не ходили в БД"""
+        if self._game is None:
+            self._load_game()
+        return self._game
+
+    @classmethod
+    async def open(cls, db: Union[Session, AsyncSession], game_id: int) -> "GameManager":
+        """
+        Создает менеджер и загружает игру
+        Raises:
+            ValueError: игра не найдена
+        """
+        manager = cls(db, game_id)
+        await manager._run(manager._load_game)
+        return manager
+
+    def _load_game(self) -> None:
+        self._game = self.db.query(Game).get(self.game_id)
+        if not self._game:
             raise ValueError(f"Игра {self.game_id} не найдена")
 
-    def _get_user_state(self, username: str) -> UserState:
-        """Получает или создает состояние пользователя в текущей игре"""
-        user_state = self.db.query(UserState).join(User).filter(
-            UserState.game_id == self.game_id,
-            User.username == username
-        ).first()
-
-        if user_state:
-            return user_state
-
-        user = self.db.query(User).filter(User.username == username).first()
-        if not user:
-            raise ValueError(f"Пользователь {username} не найден")
-
-        # Находим цвет игрока в этой игре
-        player_color = None
-        for player_entry in self.game.game_players:
-            player, color = player_entry.split(":")
-            if player == username:
-                player_color = color
-                break
-
-        if not player_color:
-            raise ValueError(f"Пользователь {username} не участник игры")
-
-        user_state = UserState(
-            game_id=self.game_id,
-            user_id=user.id,
-            color=player_color,
-            total_clicks=0,
-            success_clicks=0,
-            failed_clicks=0,
-            joined_at=datetime.utcnow()
-        )
-
-        self.db.add(user_state)
-        self.db.commit()
-        return user_state
-
-    def init_data(self) -> Dict:
+    async def _engine(self) -> Optional[GameEngine]:
+        """Движок активной игры (живое состояние в памяти процесса)"""
+        engine = get_engine(self.game_id)
+        if engine is None:
+            async with engine_load_lock(self.game_id):
+                engine = get_engine(self.game_id)
+                if engine is None:
+                    engine = await self._run(self._load_engine)
+            if engine is None:
+                # Игра не активна — блокировка загрузки ей больше не нужна
+                drop_engine(self.game_id)
+                return None
+        # Обращение продлевает жизнь движка: простаивающие выгружает flush_all
+        engine.touch()
+        return engine
+
+    def _load_engine(self) -> Optional[GameEngine]:
+        if self._game is None:
+            self._load_game()
+        else:
+            self.db.refresh(self._game)
+        if not self.game.is_active:
+            return None
+        return load_engine(self.db, self.game)
+
+    async def init_data(self) -> Dict:
         """Инициализация данных игры"""
+        return await self._run(self._init_data)
+
+    def _init_data(self) -> Dict:
+        engine = get_engine(self.game_id)
+        if engine is not None:
+            return {
+                "status": 200,
+                "seq": engine.seq,
+                "is_active": engine.is_active,
+                "players": [p.as_dict() for p in engine.slots],
+                "game_state": {**self.game.game_state, "cells": engine.cells_state()},
+                "total_clicks": engine.total_clicks,
+                "clicked_cells_count": engine.claimed
+            }
+
+        states = load_roster(self.db, self.game)
+        roster = Roster.from_game(self.game)
         data = []
-        for player_entry in self.game.game_players:
-            player, color = player_entry.split(":")
-            try:
-                player_state = self._get_user_state(player)
-                data.append({
-                    "username": player,
-                    "color": color,
-                    "total_clicks": player_state.total_clicks,
-                    "success_clicks": player_state.success_clicks,
-                    "failed_clicks": player_state.failed_clicks
-                })
-            except ValueError as e:
-                logger.warning(f"Ошибка получения состояния игрока {player}: {e}")
+        for player, color in roster:
+            player_state = states.get(player)
+            if player_state is None:
+                log_event(logger, "init_data", "Игрок не найден в составе игры", logging.WARNING,
+                          game_id=self.game_id, username=player)
+                continue
+            data.append({
+                "username": player,
+                "color": color,
+                "total_clicks": player_state.total_clicks,
+                "success_clicks": player_state.success_clicks,
+                "failed_clicks": player_state.failed_clicks
+            })
 
+        colors = roster.colors
         return {
             "status": 200,
+            "seq": self.game.total_clicks or 0,
+            "is_active": bool(self.game.is_active),
             "players": data,
-            "game_state": self.game.game_state,
+            "game_state": {**self.game.game_state, "cells": board_cells(self.game.board, colors)},
             "total_clicks": self.game.total_clicks,
-            "clicked_cells_count": len(self.game.clicked_cells)
+            "clicked_cells_count": self.game.claimed_cells or 0
         }
 
+    @timed("register_click")
     async def register_click(self, username: str, coord: int) -> Dict:
-        """Регистрирует клик игрока"""
+        """
+        Регистрирует клик игрока.
+        Клики игры применяются по очереди под engine.claim_lock. При CLAIM_MODE=memory
+        клетка занимается в памяти движка, при CLAIM_MODE=db — условным UPDATE в БД;
+        счетчики в обоих случаях пишутся в БД отложенно.
+        Returns:
+            дельту клика с номером версии seq (полное поле — через snapshot)
+        """
+        return (await self._register_clicks([(username, coord)]))[0]
+
+    @timed("register_clicks")
+    async def register_clicks(self, clicks: List[Tuple[str, int]]) -> List[Dict]:
+        """
+        Применяет пачку кликов в порядке поступления за один захват engine.claim_lock
+        Returns:
+            результат каждого клика — как у register_click
+        """
+        return await self._register_clicks(clicks)
+
+    async def _register_clicks(self, clicks: List[Tuple[str, int]]) -> List[Dict]:
+        started = time.perf_counter()
         try:
-            if not self.game.is_active:
-                return {"status": 400, "error": "Игра не активна"}
+            engine = await self._engine()
+        except Exception as e:
+            log_event(logger, "click", f"Ошибка регистрации клика: {e}", logging.ERROR, game_id=self.game_id)
+            return [{"status": 500, "error": str(e)} for _ in clicks]
+        if engine is None:
+            return [{"status": 400, "error": "Игра не активна"} for _ in clicks]
 
-            if not isinstance(coord, int) or coord < 1 or coord > 100:
-                return {"status": 400, "error": "Некорректные координаты"}
+        async with engine.claim_lock:
+            results = [await self._apply_click(engine, username, coord) for username, coord in clicks]
 
-            user_state = self._get_user_state(username)
-            is_success = coord not in self.game.clicked_cells
+        latency = time.perf_counter() - started
+        for (username, coord), result in zip(clicks, results):
+            if result["status"] == 200:
+                log_event(logger, "click", game_id=self.game_id, username=username, coord=coord,
+                          is_success=result["is_success"], latency=latency)
+        return results
 
-            # Обновляем статистику
-            self.game.total_clicks += 1
-            user_state.user.total_clicks += 1
-            user_state.total_clicks += 1
+    async def _apply_click(self, engine: GameEngine, username: str, coord: int) -> Dict:
+        """Один клик; вызывается под engine.claim_lock"""
+        if not engine.is_active:
+            return {"status": 400, "error": "Игра не активна"}
 
-            if is_success:
-                self.game.clicked_cells.append(coord)
-                self.game.game_state.setdefault("cells", {})[str(coord)] = user_state.color
-                user_state.user.success_clicks += 1
-                user_state.success_clicks += 1
+        if not isinstance(coord, int) or coord < 1 or coord > CELLS_COUNT:
+            return {"status": 400, "error": "Некорректные координаты"}
+
+        if username not in engine.players:
+            return {"status": 400, "error": f"Пользователь {username} не участник игры"}
+
+        try:
+            if engine.board_in_db:
+                player = engine.players[username]
+                claim = await self._run(claim_cell_in_db, self.db, self.game_id, coord, player.slot)
+                if claim is None:
+                    # Игру уже завершил другой воркер: зеркало закрываем, клик не учитываем
+                    engine.is_active = False
+                    return {"status": 400, "error": "Игра не активна"}
+                is_success, owner, claimed, seq = claim
+                engine.record_click(player, coord, is_success, owner, claimed, seq)
             else:
-                user_state.user.failed_clicks += 1
-                user_state.failed_clicks += 1
+                is_success, player = engine.click(username, coord)
+                seq = engine.seq
+        except Exception as e:
+            log_event(logger, "click", f"Ошибка регистрации клика: {e}", logging.ERROR,
+                      game_id=self.game_id, username=username)
+            return {"status": 500, "error": str(e)}
 
-            self.db.commit()
+        # Дельта: только изменившаяся клетка и счетчики, без полного поля
+        return {
+            "status": 200,
+            "seq": seq,
+            'click': 1 if is_success else 0,
+            "player": username,
+            "slot": player.slot,
+            "coord": coord,
+            "color": player.color if is_success else None,
+            "is_success": is_success,
+            "player_stats": player.as_dict(),
+            "game_stats": engine.game_stats()
+        }
 
+    async def snapshot(self) -> Dict:
+        """Полное состояние игры для клиента, потерявшего дельты"""
+        engine = await self._engine()
+        if engine is None:
+            init = await self.init_data()
+            # Движка нет — игра завершена: снимок из БД с is_active=false, клиент не покажет ее живой
             return {
                 "status": 200,
-                'click': 1 if is_success else 0,
-                "player": username,
-                "coord": coord,
-                "color": user_state.color if is_success else None,
-                "is_success": is_success,
-                "state": self.game.game_state,
+                "seq": init["seq"],
+                "is_active": init["is_active"],
+                "cells": init["game_state"].get("cells", {}),
+                "players": init["players"],
                 "game_stats": {
-                    "total_clicks": self.game.total_clicks,
-                    "clicked_cells": len(self.game.clicked_cells)
+                    "total_clicks": init["total_clicks"],
+                    "clicked_cells": init["clicked_cells_count"]
                 }
             }
-
-        except Exception as e:
-            logger.error(f"Ошибка регистрации клика: {e}")
-            self.db.rollback()
-            return {"status": 500, "error": str(e)}
+        if engine.board_in_db:
+            # Поле авторитетно в БД: дополняем зеркало клетками, занятыми через другие воркеры
+            engine.merge_board(*await self._run(read_board, self.db, self.game_id))
+        return {"status": 200, **engine.snapshot()}
 
     async def check_finish_game(self) -> Optional[Dict]:
-        """Проверяет завершение игры"""
-        if len(self.game.clicked_cells) >= 100:
-            return await self.finish_game()
-        return None
-
+        """
+        Завершает игру, если поле заполнено. Итоги подводятся один раз:
+        Returns:
+            результат finish_game — только тому вызову, который завершил игру, иначе None
+        """
+        engine = get_engine(self.game_id)
+        if engine is None or not engine.is_full or not engine.is_active:
+            return None
+        return await settlements.settle(self.game_id, self._settle)
+
+    async def _settle(self) -> Dict:
+        engine = get_engine(self.game_id)
+        if engine is None or not engine.is_active:
+            return {"status": 400, "error": "Игра уже завершена"}
+        # Закрываем движок до первого await: новые клики отклоняются
+        engine.is_active = False
+        result = await self.finish_game()
+        if result["status"] == 500:
+            engine.is_active = True  # завершение повторится на следующем клике
+        return result
+
+    @timed("finish_game")
     async def finish_game(self) -> Dict:
         """Завершает игру и возвращает результаты"""
+        started = time.perf_counter()
+        engine = get_engine(self.game_id)
+        if engine is None:
+            result = await self._run(self._finish_game)
+        else:
+            async with engine.flush_lock:
+                result = await self._run(self._finish_game)
+        log_event(logger, "finish", game_id=self.game_id, status=result["status"],
+                  winners=result.get("winners"), latency=time.perf_counter() - started)
+        return result
+
+    def _finish_game(self) -> Dict:
         try:
-            if not self.game.is_active:
+            engine = get_engine(self.game_id)
+            if engine is not None:
+                # Сбрасываем в БД все, что движок еще не записал
+                engine.flush(self.db)
+                self.db.refresh(self.game)
+
+            # Сравнение с обменом: итоги пишет только транзакция, закрывшая игру.
+            # Строка игры остается заблокированной до commit, конкурент увидит is_active = false
+            closed = self.db.execute(
+                update(Game)
+                .where(Game.id == self.game_id, Game.is_active == True)  # noqa: E712
+                .values(is_active=False)
+                .returning(Game.board)
+                .execution_options(synchronize_session=False)
+            ).first()
+            if closed is None:
+                self.db.rollback()
+                if engine is not None:
+                    drop_engine(self.game_id)
                 return {"status": 400, "error": "Игра уже завершена"}
 
-            players_stats = []
-            for player_entry in self.game.game_players:
-                username, color = player_entry.split(":")
-                user_state = self._get_user_state(username)
+            # Итоги всех игроков одним запросом: состав игры JOIN users LEFT JOIN user_states
+            # Очки — клетки игрока по полю из БД: единственный авторитетный владелец клеток.
+            # Счетчики user_states пишутся отложенно и при нескольких воркерах могут отставать
+            board = bytes(closed.board or b"")
+            rows = self.db.query(
+                GamePlayer.user_id, User.username, GamePlayer.color, GamePlayer.slot, UserState.id,
+                UserState.total_clicks, UserState.success_clicks, UserState.failed_clicks
+            ).join(
+                User, User.id == GamePlayer.user_id
+            ).outerjoin(
+                UserState, and_(UserState.user_id == GamePlayer.user_id, UserState.game_id == GamePlayer.game_id)
+            ).filter(GamePlayer.game_id == self.game_id).order_by(GamePlayer.slot).all()
 
-                stats = {
+            players_stats = []
+            missing_states = []
+            for user_id, username, color, slot, state_id, total, success, failed in rows:
+                if state_id is None:
+                    # Игрок не кликал — фиксируем нулевое состояние, как раньше
+                    missing_states.append({
+                        "game_id": self.game_id, "user_id": user_id, "color": color,
+                        "total_clicks": 0, "success_clicks": 0, "failed_clicks": 0,
+                        "joined_at": datetime.utcnow()
+                    })
+                score = board.count(slot)
+                failed = failed or 0
+                total = max(total or 0, score + failed)
+                players_stats.append({
+                    "user_id": user_id,
                     "username": username,
                     "color": color,
-                    "score": user_state.success_clicks,
+                    "score": score,
                     "stats": {
-                        "total": user_state.total_clicks,
-                        "success": user_state.success_clicks,
-                        "failed": user_state.failed_clicks
+                        "total": total,
+                        "success": score,
+                        "failed": failed
                     }
-                }
-                players_stats.append(stats)
+                })
 
-                # Обновляем глобальную статистику
-                user_state.user.total_games += 1
-                if color not in user_state.user.color_used:
-                    user_state.user.color_used.append(color)
+            if missing_states:
+                self.db.execute(insert(UserState), missing_states)
 
             # Определяем победителей
             max_score = max(p["score"] for p in players_stats)
             winners = [p["username"] for p in players_stats if p["score"] == max_score]
+            winner_ids = [p["user_id"] for p in players_stats if p["score"] == max_score]
+
+            # Глобальная статистика всех игроков одним UPDATE: игры, победы, использованные цвета
+            color_of = cast(case({p["user_id"]: p["color"] for p in players_stats}, value=User.id), String)
+            self.db.execute(
+                update(User)
+                .where(User.id.in_([p["user_id"] for p in players_stats]))
+                .values(
+                    total_games=func.coalesce(User.total_games, 0) + 1,
+                    wins_count=func.coalesce(User.wins_count, 0) + case((User.id.in_(winner_ids), 1), else_=0),
+                    color_used=case(
+                        (User.color_used.any(color_of), User.color_used),
+                        else_=func.array_append(User.color_used, color_of)
+                    )
+                )
+                .execution_options(synchronize_session=False)
+            )
 
-            # Обновляем статистику победителей
-            for user in self.db.query(User).filter(User.username.in_(winners)):
-                user.wins_count += 1
+            # Агрегаты рейтинга — в той же транзакции, что и итог игры
+            record_results(self.db, [
+                GameResult(p["user_id"], p["username"], p["color"], p["stats"]["total"],
+                           p["stats"]["success"], p["username"] in winners)
+                for p in players_stats
+            ])
+            for p in players_stats:
+                del p["user_id"]
 
             # Финализируем игру
             self.game.is_active = False
@@ -450,6 +625,9 @@ class GameManager(BaseGameManager):
             })
 
             self.db.commit()
+            leaderboard_cache.clear()
+            if engine is not None:
+                drop_engine(self.game_id)
 
             return {
                 "status": 200,
@@ -459,6 +637,6 @@ class GameManager(BaseGameManager):
             }
 
         except Exception as e:
-            logger.error(f"Ошибка завершения игры: {e}")
+            log_event(logger, "finish", f"Ошибка завершения игры: {e}", logging.ERROR, game_id=self.game_id)
             self.db.rollback()
             return {"status": 500, "error": str(e)}
\ No newline at end of file
@@ -0,0 +1,78 @@
+# wire.py
+"""
+Формат сообщений игровых сокетов.
+
+По умолчанию сообщения — JSON-текст. Клиент, предложивший подпротокол
+BINARY_SUBPROTOCOL, получает дельты кликов (самое частое сообщение) бинарным
+кадром фиксированной длины (пачка кликов — несколько кадров подряд в одном
+сообщении), остальное (снимок, итог игры, ошибки) — JSON.
+Игрок в кадре — номер слота: имена и цвета по слотам клиент знает из снимка.
+
+Кадр дельты клика, big-endian, 26 байт:
+    B opcode (OP_CLICK)   B флаги (бит 0 — клетка занята этим кликом)
+    B слот игрока         B клетка (1..CELLS_COUNT)
+    I seq
+    I total_clicks, I success_clicks, I failed_clicks игрока
+    I total_clicks игры   H clicked_cells игры
+"""
+import struct
+from typing import Dict, Optional
+
+from starlette.websockets import WebSocket
+
+from config import WIRE_BINARY
+
+BINARY_SUBPROTOCOL = "clicker.bin.v1"
+
+OP_CLICK = 1
+FLAG_SUCCESS = 1
+
+CLICK_FRAME = struct.Struct(">BBBBIIIIIH")
+
+
+def negotiate(websocket: WebSocket) -> Optional[str]:
+    """Подпротокол соединения: бинарный, если клиент его предложил и он разрешен"""
+    if WIRE_BINARY and BINARY_SUBPROTOCOL in websocket.scope.get("subprotocols", ()):
+        return BINARY_SUBPROTOCOL
+    return None
+
+
+def encode_binary(message: dict) -> Optional[bytes]:
+    """Бинарные кадры сообщения или None, если у его типа кадра нет (уходит JSON)"""
+    kind = message.get("type")
+    if kind == "click_result":
+        return _click_frame(message["data"])
+    if kind == "click_batch":
+        return b"".join(_click_frame(data) for data in message["data"])
+    return None
+
+
+def _click_frame(data: dict) -> bytes:
+    player = data["player_stats"]
+    game = data["game_stats"]
+    return CLICK_FRAME.pack(
+        OP_CLICK,
+        FLAG_SUCCESS if data["is_success"] else 0,
+        data["slot"],
+        data["coord"],
+        data["seq"],
+        player["total_clicks"],
+        player["success_clicks"],
+        player["failed_clicks"],
+        game["total_clicks"],
+        game["clicked_cells"]
+    )
+
+
+def decode_click(frame: bytes) -> Dict:
+    """Разбор кадра дельты клика (как это делает game.html)"""
+    (_, flags, slot, coord, seq, total, success, failed,
+     game_total, clicked) = CLICK_FRAME.unpack(frame)
+    return {
+        "seq": seq,
+        "slot": slot,
+        "coord": coord,
+        "is_success": bool(flags & FLAG_SUCCESS),
+        "player_stats": {"total_clicks": total, "success_clicks": success, "failed_clicks": failed},
+        "game_stats": {"total_clicks": game_total, "clicked_cells": clicked}
+    }